@@ -0,0 +1,174 @@
+# analytics.py
+import calendar
+import datetime
+
+import numpy as np
+import pandas as pd
+from sqlmodel import Session, select
+
+import models
+
+THRESHOLDS = models.THRESHOLDS
+
+READING_COLUMNS = ["date", "time", "reading"]
+
+# "%I" for each hour of the day
+HOURS_12 = np.array([f"{(hour + 11) % 12 + 1:02d}" for hour in range(24)])
+
+
+def load_readings(
+    sess: Session,
+    meter_id,
+    start: datetime.date | None = None,
+    end: datetime.date | None = None,
+) -> pd.DataFrame:
+    """
+    A meter's readings with start <= reading_date < end as one frame,
+    oldest first, with columns date, time and reading.
+    """
+    query = (
+        select(
+            models.Reading.reading_date,
+            models.Reading.reading_time,
+            models.Reading.reading_value,
+        )
+        .where(models.Reading.meter_id == meter_id)
+        .order_by(models.Reading.reading_time, models.Reading.id)
+    )
+    if start is not None:
+        query = query.where(models.Reading.reading_date >= start)
+    if end is not None:
+        query = query.where(models.Reading.reading_date < end)
+    frame = pd.DataFrame.from_records(sess.exec(query).all(), columns=READING_COLUMNS)
+    frame["date"] = pd.to_datetime(frame["date"])
+    frame["time"] = pd.to_datetime(frame["time"])
+    frame["reading"] = frame["reading"].astype(float)
+    return frame
+
+
+def load_month_readings(sess: Session, meter_ids: list, year: int, month: int) -> pd.DataFrame:
+    """
+    Several meters' readings for one month as one frame, oldest first,
+    with a meter_id column besides date, time and reading.
+    """
+    first_day = datetime.date(year, month, 1)
+    next_month = datetime.date(year + month // 12, month % 12 + 1, 1)
+    rows = sess.exec(
+        select(
+            models.Reading.meter_id,
+            models.Reading.reading_date,
+            models.Reading.reading_time,
+            models.Reading.reading_value,
+        )
+        .where(
+            models.Reading.meter_id.in_(meter_ids),
+            models.Reading.reading_date >= first_day,
+            models.Reading.reading_date < next_month,
+        )
+        .order_by(models.Reading.reading_time, models.Reading.id)
+    ).all()
+    frame = pd.DataFrame.from_records(rows, columns=["meter_id", *READING_COLUMNS])
+    frame["date"] = pd.to_datetime(frame["date"])
+    frame["time"] = pd.to_datetime(frame["time"])
+    frame["reading"] = frame["reading"].astype(float)
+    return frame
+
+
+def load_starts(sess: Session, meter_id, year: int) -> dict[int, float]:
+    """The year's start readings, keyed by month."""
+    return dict(
+        sess.exec(
+            select(models.StartReading.month, models.StartReading.reading_value).where(
+                models.StartReading.meter_id == meter_id,
+                models.StartReading.year == year,
+            )
+        ).all()
+    )
+
+
+def load_month_starts(sess: Session, meter_ids: list, year: int, month: int) -> dict:
+    """Start readings of several meters for one month, keyed by meter id."""
+    return dict(
+        sess.exec(
+            select(models.StartReading.meter_id, models.StartReading.reading_value).where(
+                models.StartReading.meter_id.in_(meter_ids),
+                models.StartReading.year == year,
+                models.StartReading.month == month,
+            )
+        ).all()
+    )
+
+
+def levels(units) -> np.ndarray:
+    """models.threshold_level over a whole array."""
+    return np.searchsorted(THRESHOLDS, np.asarray(units, dtype=float), side="left")
+
+
+def bands(units) -> np.ndarray:
+    """models.threshold_band over a whole array."""
+    reached = np.searchsorted(THRESHOLDS, np.asarray(units, dtype=float), side="right")
+    return np.array((0, *THRESHOLDS))[reached]
+
+
+def add_month_columns(frame: pd.DataFrame, starts: dict[int, float]) -> pd.DataFrame:
+    """
+    Add per-reading columns for a single year's frame: month, start (0 when
+    the month has none), units since the start, delta over the month's
+    previous reading (over the start for its first), level and band.
+    """
+    frame = frame.copy()
+    frame["month"] = frame["date"].dt.month
+    frame["start"] = frame["month"].map(starts).fillna(0.0).astype(float)
+    frame["units"] = frame["reading"] - frame["start"]
+    frame["delta"] = frame.groupby("month")["reading"].diff().fillna(frame["units"])
+    frame["level"] = levels(frame["units"])
+    frame["band"] = bands(frame["units"])
+    return frame
+
+
+def month_rollup(frame: pd.DataFrame, starts: dict[int, float], year: int) -> pd.DataFrame:
+    """
+    One row per month 1-12 of a frame from add_month_columns: start,
+    entries, latest reading, consumption and average daily consumption.
+    """
+    months = pd.Index(range(1, 13), name="month")
+    grouped = frame.groupby("month")
+    rollup = pd.DataFrame(index=months)
+    rollup["start"] = pd.Series(starts, dtype=float).reindex(months).fillna(0.0)
+    rollup["entries"] = grouped.size().reindex(months, fill_value=0)
+    # Frames are ordered by time, so the last reading is the latest
+    rollup["latest"] = grouped["reading"].last().reindex(months)
+    rollup["consumption"] = (rollup["latest"] - rollup["start"]).where(rollup["entries"] > 0, 0.0)
+    rollup["days"] = [calendar.monthrange(year, month)[1] for month in months]
+    rollup["average_daily"] = (rollup["consumption"] / rollup["days"]).where(
+        rollup["consumption"] > 0, 0.0
+    )
+    return rollup
+
+
+def rolling_daily(
+    frame: pd.DataFrame, window: int = 7, end: datetime.date | None = None
+) -> pd.DataFrame:
+    """
+    Units per calendar day of a frame from add_month_columns (its delta
+    column summed by day) and their rolling mean over `window` days. Days
+    without readings count as 0, up to `end` if that is later than the
+    last reading.
+    """
+    daily = frame.groupby(frame["time"].dt.normalize())["delta"].sum()
+    if not daily.empty:
+        last = max(daily.index[-1], pd.Timestamp(end)) if end is not None else daily.index[-1]
+        daily = daily.reindex(pd.date_range(daily.index[0], last, freq="D"), fill_value=0.0)
+    return pd.DataFrame({"units": daily, "rolling_mean": daily.rolling(window, min_periods=1).mean()})
+
+
+def format_times(times: pd.Series) -> list[str]:
+    """
+    Format times as "%Y-%m-%d %I:%M:%S %p" with whole-column string ops,
+    several times faster than strftime per value.
+    """
+    iso = pd.Series(np.datetime_as_string(times.to_numpy(), unit="s"), index=times.index)
+    hours = times.dt.hour.to_numpy()
+    clock = pd.Series(HOURS_12[hours], index=times.index)
+    meridiem = pd.Series(np.where(hours < 12, " AM", " PM"), index=times.index)
+    return (iso.str.slice(0, 10) + " " + clock + iso.str.slice(13, 19) + meridiem).tolist()
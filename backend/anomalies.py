@@ -0,0 +1,97 @@
+# anomalies.py
+import datetime
+import os
+
+import models
+
+# Weight of a rate observation halves every this many days
+HALF_LIFE_DAYS = float(os.getenv("ANOMALY_HALF_LIFE_DAYS", "3"))
+# Readings closer together than this say little about the rate
+MIN_INTERVAL_DAYS = 1 / 24
+# A rise at this many times the usual rate, and at least this many units
+SPIKE_FACTOR = float(os.getenv("ANOMALY_SPIKE_FACTOR", "5"))
+SPIKE_MIN_UNITS = float(os.getenv("ANOMALY_SPIKE_MIN_UNITS", "20"))
+
+
+def new_stats(meter_id, year: int, month: int, start_value: float) -> models.MeterStats:
+    return models.MeterStats(
+        meter_id=meter_id,
+        year=year,
+        month=month,
+        start_value=start_value,
+        last_value=start_value,
+        last_time=datetime.datetime(year, month, 1),
+    )
+
+
+def start_month(stats: models.MeterStats, year: int, month: int, start_value: float):
+    """Move stats on to a new billing month, keeping the learned daily rate."""
+    stats.year, stats.month = year, month
+    stats.start_value = stats.last_value = start_value
+    stats.last_time = datetime.datetime(year, month, 1)
+    stats.projected_units = None
+    stats.projected_band = 0
+
+
+def observe(
+    stats: models.MeterStats,
+    year: int,
+    month: int,
+    reading_time: datetime.datetime,
+    value: float,
+    start_value: float,
+) -> list[tuple[str, str]]:
+    """
+    Fold one reading into `stats` in constant time and return the
+    (kind, detail) alerts it raises:
+
+    - drop: below the previous reading, so likely a typo. It is not
+      folded in, so later readings are still checked against the last
+      good one.
+    - spike: a rise far above the usual daily rate.
+    - overrun: the month-end projection (units so far plus the EWMA daily
+      rate over the days left) crossed into a higher threshold band.
+
+    Readings older than the tracked month or reading are left alone.
+    """
+    if (year, month) < (stats.year, stats.month):
+        return []
+    if (year, month) > (stats.year, stats.month):
+        start_month(stats, year, month, start_value)
+    if reading_time < stats.last_time:
+        return []
+
+    if value < stats.last_value:
+        return [("drop", f"Reading {value:g} is below the previous {stats.last_value:g}; likely a typo.")]
+
+    alerts = []
+    rise = value - stats.last_value
+    days = (reading_time - stats.last_time).total_seconds() / 86400
+    if days >= MIN_INTERVAL_DAYS:
+        rate = rise / days
+        if stats.daily_rate and rise >= SPIKE_MIN_UNITS and rate > SPIKE_FACTOR * stats.daily_rate:
+            alerts.append((
+                "spike",
+                f"Rise of {rise:g} units is {rate / stats.daily_rate:.0f}x the usual daily rate.",
+            ))
+        elif stats.daily_rate is None:
+            stats.daily_rate = rate
+        else:
+            weight = 1 - 0.5 ** (days / HALF_LIFE_DAYS)
+            stats.daily_rate += weight * (rate - stats.daily_rate)
+    stats.last_value, stats.last_time = value, reading_time
+
+    if stats.daily_rate is not None:
+        units = value - stats.start_value
+        month_end = datetime.datetime(year + month // 12, month % 12 + 1, 1)
+        days_left = max((month_end - reading_time).total_seconds() / 86400, 0.0)
+        stats.projected_units = units + stats.daily_rate * days_left
+        projected_band = models.threshold_band(stats.projected_units)
+        if projected_band > max(stats.projected_band, models.threshold_band(units)):
+            alerts.append((
+                "overrun",
+                f"On track for {stats.projected_units:.0f} units this month, "
+                f"past the {projected_band}-unit band.",
+            ))
+        stats.projected_band = projected_band
+    return alerts
@@ -0,0 +1,171 @@
+# compression.py
+import os
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only without it
+    brotli = None
+
+# Bodies smaller than this go out as they are; compressing them saves
+# less than the header overhead and a round of CPU
+MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", "4"))
+
+# Media types that are compressed already (xlsx and zip exports) or never
+# worth it; matched as prefixes of Content-Type
+SKIP_TYPES = (
+    "application/vnd.openxmlformats-officedocument.",
+    "application/zip",
+    "application/gzip",
+    "application/octet-stream",
+    "image/",
+    "audio/",
+    "video/",
+    "text/event-stream",
+)
+
+
+def choose_encoding(accept_encoding: str) -> str | None:
+    """br or gzip, whichever the client accepts with the higher q, br on ties."""
+    offered = {"gzip": 0.0}
+    if brotli is not None:
+        offered["br"] = 0.0
+    wildcard = None
+    explicit = set()
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if name == "*":
+            wildcard = q
+        elif name in offered:
+            offered[name] = q
+            explicit.add(name)
+    if wildcard is not None:
+        for name in offered:
+            if name not in explicit:
+                offered[name] = wildcard
+    best = max(offered, key=lambda name: (offered[name], name == "br"))
+    return best if offered[best] > 0 else None
+
+
+class _Gzip:
+    def __init__(self):
+        self._zlib = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes) -> bytes:
+        # Sync-flushed so each streamed chunk can be decoded on arrival
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes) -> bytes:
+        return self._zlib.compress(data) + self._zlib.flush()
+
+
+class _Brotli:
+    def __init__(self):
+        self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._brotli.process(data) + self._brotli.flush()
+
+    def finish(self, data: bytes) -> bytes:
+        return self._brotli.process(data) + self._brotli.finish()
+
+
+compressors = {"gzip": _Gzip, "br": _Brotli}
+
+
+class CompressionMiddleware:
+    """
+    Negotiated gzip/brotli for response bodies of at least MIN_SIZE bytes.
+    Whole bodies are compressed in one go; streamed bodies chunk by chunk,
+    so nothing is buffered. Media types in SKIP_TYPES, bodies that already
+    have a Content-Encoding, HEAD requests and bodiless statuses pass
+    through untouched.
+    """
+
+    def __init__(self, app, min_size: int = MIN_SIZE):
+        self.app = app
+        self.min_size = min_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        compressor = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                length = headers.get("content-length")
+                passthrough = (
+                    message["status"] < 200
+                    or message["status"] in (204, 304)
+                    or "content-encoding" in headers
+                    or headers.get("content-type", "").startswith(SKIP_TYPES)
+                    or (length is not None and int(length) < self.min_size)
+                )
+                if passthrough:
+                    await send(message)
+                else:
+                    start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start is not None:
+                # First body message: decide now that its size is known
+                headers = MutableHeaders(raw=start["headers"])
+                headers.add_vary_header("Accept-Encoding")
+                if not more_body and len(body) < self.min_size:
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    start = None
+                    return
+                compressor = compressors[encoding]()
+                headers["Content-Encoding"] = encoding
+                # The compressed bytes are a different representation
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    headers["ETag"] = f"W/{etag}"
+                if not more_body:
+                    data = compressor.finish(body)
+                    headers["Content-Length"] = str(len(data))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": data, "more_body": False})
+                    start = None
+                    return
+                if "content-length" in headers:
+                    del headers["content-length"]
+                await send(start)
+                start = None
+
+            if more_body:
+                data = compressor.chunk(body)
+                if data:
+                    await send({"type": "http.response.body", "body": data, "more_body": True})
+            else:
+                await send({"type": "http.response.body", "body": compressor.finish(body), "more_body": False})
+
+        await self.app(scope, receive, send_compressed)
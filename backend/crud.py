@@ -1,517 +1,219 @@
 # crud.py
 from sqlmodel import Session, select
+from sqlalchemy import and_, or_, not_, insert, delete, tuple_, func, extract
+from sqlalchemy.orm import aliased
+from sqlalchemy.util import greenlet_spawn
 from fastapi import HTTPException
 import datetime
 import models, schemas
-from database import engine
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from io import BytesIO
-import calendar
-
-
-from openpyxl.styles import PatternFill, Font, Alignment
-
-# Define fill colors for thresholds (light to dark red)
-fills = {
-    170: PatternFill(start_color="FFCCCC", end_color="FFCCCC", fill_type="solid"),  # light red
-    180: PatternFill(start_color="FF6666", end_color="FF6666", fill_type="solid"),  # medium red
-    190: PatternFill(start_color="CC0000", end_color="CC0000", fill_type="solid"),  # dark red
-    200: PatternFill(start_color="800000", end_color="800000", fill_type="solid"),  # very dark red
-}
-
-# Decide font color based on background (light bg => black text, dark bg => white text)
-def get_font_color(change):
-    if change >= 190:
-        return Font(color="FFFFFF")  # white font for dark background
-    else:
-        return Font(color="000000")  # black font for light/medium background
-
-# Determine which fill to apply
-def get_fill(change):
-    if change >= 200:
-        return fills[200]
-    elif change >= 190:
-        return fills[190]
-    elif change >= 180:
-        return fills[180]
-    elif change >= 170:
-        return fills[170]
-    else:
-        return None  # no fill
-
-def get_meters(household_token: str) -> list[schemas.MeterOut]:
+import anomalies
+from database import engine, async_engine, session_scope, DB_ASYNC
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from export_cache import data_versions
+from read_cache import read_cache
+from pydantic import TypeAdapter, ValidationError
+from functools import partial
+from tempfile import SpooledTemporaryFile
+import base64
+import logging
+import time
+from uuid import UUID, uuid4
+
+logger = logging.getLogger(__name__)
+
+meter_list = TypeAdapter(list[schemas.MeterOut])
+
+def get_meters(
+    household_token: str, sess: Session | None = None, cached: bool = True
+) -> list[schemas.MeterOut]:
     """
     Return a list of MeterOut for all meters in the given household,
     including computed `current_month_units`.
+
+    Everything is read from the monthly rollups in a single round-trip:
+    the current month is a primary-key join and the other lookups are
+    correlated subqueries over the meter's rollup rows.
+
+    Results are cached per household until the next write to one of its
+    meters (or READ_CACHE_TTL seconds, whichever comes first). Pass
+    cached=False to read through `sess` only, e.g. from inside a write.
     """
     today = datetime.date.today()
-    first_of_month = datetime.date(today.year, today.month, 1)
-
-    with Session(engine) as sess:
-        meters = sess.exec(
-            select(models.Meter).where(models.Meter.household_token == household_token)
-        ).all()
+    cache_name = f"meters:{today:%Y-%m}"
+    if cached:
+        version = read_cache.version(household_token)
+        hit = read_cache.get(cache_name, household_token, version)
+        if hit is not None:
+            return meter_list.validate_json(hit)
+
+    rollup = models.MonthlyRollup
+    current = aliased(rollup)
+    before = or_(rollup.year < today.year, and_(rollup.year == today.year, rollup.month < today.month))
+
+    def latest_value(*criteria):
+        return (
+            select(rollup.latest_value)
+            .where(rollup.meter_id == models.Meter.id, rollup.entry_count > 0, *criteria)
+            .order_by(rollup.latest_time.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
 
-        result: list[schemas.MeterOut] = []
-        for m in meters:
-            # 1) total_units: most recent ever
-            latest_value = (
-                sess.exec(
-                    select(models.Reading.reading_value)
-                    .where(models.Reading.meter_id == m.id)
-                    .order_by(models.Reading.reading_time.desc())
-                    .limit(1)
-                ).first()
-                or 0.0
+    # 1) total_units: most recent ever
+    latest = latest_value()
+    # 2) start_val for this month, falling back to last reading before it
+    before_month = latest_value(before)
+    # 3) end_of_month: latest reading this month
+    this_month = latest_value(not_(before))
+
+    with session_scope(sess) as sess:
+        rows = sess.exec(
+            select(
+                models.Meter.id,
+                models.Meter.name,
+                latest,
+                current.start_value,
+                before_month,
+                this_month,
             )
-
-            # 2) Determine start_val for this month
-            sr = sess.exec(
-                select(models.StartReading).where(
-                    models.StartReading.meter_id == m.id,
-                    models.StartReading.year == today.year,
-                    models.StartReading.month == today.month,
-                )
-            ).one_or_none()
-
-            if sr:
-                start_val = sr.reading_value
-            else:
-                # Fallback to last reading before this month
-                start_val = (
-                    sess.exec(
-                        select(models.Reading.reading_value)
-                        .where(
-                            models.Reading.meter_id == m.id,
-                            models.Reading.reading_date < first_of_month,
-                        )
-                        .order_by(models.Reading.reading_time.desc())
-                        .limit(1)
-                    ).first()
-                    or 0.0
-                )
-
-            # 3) Determine end_of_month: latest reading this month
-            end_val = (
-                sess.exec(
-                    select(models.Reading.reading_value)
-                    .where(
-                        models.Reading.meter_id == m.id,
-                        models.Reading.reading_date >= first_of_month,
-                    )
-                    .order_by(models.Reading.reading_time.desc())
-                    .limit(1)
-                ).first()
-                or start_val
+            .outerjoin(
+                current,
+                and_(
+                    current.meter_id == models.Meter.id,
+                    current.year == today.year,
+                    current.month == today.month,
+                ),
             )
+            .where(models.Meter.household_token == household_token)
+        ).all()
 
-            current_month_units = end_val - start_val
-
-            result.append(
-                schemas.MeterOut(
-                    id=m.id,
-                    name=m.name,
-                    total_units=latest_value,
-                    current_month_units=current_month_units,
-                )
+    result: list[schemas.MeterOut] = []
+    for meter_id, name, latest_val, sr_val, before_val, end_val in rows:
+        start_val = sr_val if sr_val is not None else (before_val or 0.0)
+        end_val = end_val or start_val
+        result.append(
+            schemas.MeterOut(
+                id=meter_id,
+                name=name,
+                total_units=latest_val or 0.0,
+                current_month_units=end_val - start_val,
             )
-        return result
+        )
+    if cached:
+        read_cache.set(cache_name, household_token, version, meter_list.dump_json(result).decode())
+    return result
+
 def get_meter_by_id(meter_id: str):
     """Get meter by ID for Excel export"""
     with Session(engine) as sess:
         meter = sess.get(models.Meter, meter_id)
         return meter
     
-def get_yearly_data_for_export(meter_id: str, year: int):
-    """Get all 12 months of data for Excel export"""
-    yearly_data = []
-    
-    for month in range(1, 13):
-        try:
-            # Use your existing get_monthly_data function
-            month_data = get_monthly_data(meter_id, year, month)
-            
-            # Calculate additional metrics
-            entries = month_data.entries
-            start_reading = month_data.start_reading
-            
-            # Calculate consumption
-            total_consumption = 0
-            if entries:
-                # Get the latest reading for the month
-                latest_entry = max(entries, key=lambda x: x.time)
-                total_consumption = latest_entry.reading - start_reading
-            
-            # Calculate average daily
-            days_in_month = calendar.monthrange(year, month)[1]
-            avg_daily = total_consumption / days_in_month if total_consumption > 0 else 0
-            
-            monthly_summary = {
-                'month': month,
-                'month_name': calendar.month_name[month],
-                'year': year,
-                'start_reading': start_reading,
-                'entries': entries,
-                'total_consumption': max(0, total_consumption),
-                'average_daily': avg_daily,
-                'total_readings': len(entries),
-                'days_in_month': days_in_month,
-                
-            }
-            
-            yearly_data.append(monthly_summary)
-            
-        except Exception as e:
-            print(f"Error getting data for {year}-{month}: {e}")
-            # Handle months with no data
-            yearly_data.append({
-                'month': month,
-                'month_name': calendar.month_name[month],
-                'year': year,
-                'start_reading': 0,
-                'entries': [],
-                'total_consumption': 0,
-                'average_daily': 0,
-                'total_readings': 0,
-                'days_in_month': calendar.monthrange(year, month)[1]
-            })
-    
-    return yearly_data
-
-class ExcelExportService:
-    def __init__(self):
-        # Styling to match your app theme
-        self.header_fill = PatternFill(start_color="004D40", end_color="004D40", fill_type="solid")
-        self.accent_fill = PatternFill(start_color="D8BFD8", end_color="D8BFD8", fill_type="solid")
-        self.header_font = Font(color="FFFFFF", bold=True)
-        self.title_font = Font(color="004D40", bold=True, size=14)
-        self.border = Border(
-            left=Side(style='thin'), right=Side(style='thin'),
-            top=Side(style='thin'), bottom=Side(style='thin')
-        )
-    
-    def create_yearly_excel(self, meter, yearly_data):
-        """Create Excel file with summary + 12 monthly sheets"""
-        wb = Workbook()
-        wb.remove(wb.active)  # Remove default sheet
-        
-        # Create summary sheet first
-        self._create_summary_sheet(wb, meter, yearly_data)
-       
-        # Create monthly sheets
-        for month_data in yearly_data:
-            self._create_monthly_sheet(wb, meter, month_data)
-        
-        # Save to BytesIO
-        excel_buffer = BytesIO()
-        wb.save(excel_buffer)
-        excel_buffer.seek(0)
-        print("HRHEHEHREHEHEHRH")
-        return excel_buffer
-    
-    def _create_summary_sheet(self, wb, meter, yearly_data):
-        """Create annual summary sheet"""
-        ws = wb.create_sheet("Annual Summary", 0)
-        year = yearly_data[0]['year'] if yearly_data else datetime.datetime.now().year
-
-        # Define fills for color coding (light to dark red)
-        fills = {
-            170: PatternFill(start_color="FFCCCC", end_color="FFCCCC", fill_type="solid"),  # light red
-            180: PatternFill(start_color="FF6666", end_color="FF6666", fill_type="solid"),  # medium red
-            190: PatternFill(start_color="CC0000", end_color="CC0000", fill_type="solid"),  # dark red
-            200: PatternFill(start_color="800000", end_color="800000", fill_type="solid"),  # very dark red
-        }
-
-        def get_fill(value):
-            if value >= 200:
-                return fills[200]
-            elif value >= 190:
-                return fills[190]
-            elif value >= 180:
-                return fills[180]
-            elif value >= 170:
-                return fills[170]
-            else:
-                return None
-
-        def get_font_color(value):
-            # White font on dark backgrounds, else black
-            if value >= 190:
-                return Font(color="FFFFFF")
-            else:
-                return Font(color="000000")
-        ws.column_dimensions['A'].width = 30
-
-        # Header
-        ws['A1'] = f"Annual Energy Report - {meter.name}"
-        ws['A1'].font = Font(size=16, bold=True, color="004D40")
-        ws.merge_cells('A1:F1')
-        ws['A1'].alignment = Alignment(horizontal='center')
-
-        # Meter info
-        if meter.name == "First Floor Meter":
-            meter.name = "FIRST FLOOR (SAY39286)"
-        ws['A3'] = f"{meter.name}"
-        ws['A4'] = f"Report Year: {year}"
-        ws['A5'] = f"Generated: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-
-        # Monthly summary table headers
-        headers = ["Month", "Start Reading", "Total Entries", "Monthly Consumption", "Avg Daily"]
-        for idx, header in enumerate(headers, 1):
-            cell = ws.cell(8, idx, header)
-            cell.fill = self.header_fill
-            cell.font = self.header_font
-            cell.alignment = Alignment(horizontal='center')
-            cell.border = self.border
-
-        total_consumption = 0
-        total_entries = 0
-        latest_start_reading = 0
-
-        # Fill monthly data rows
-        for idx, month_data in enumerate(yearly_data, 9):
-            entries = month_data.get('entries', [])
-            start_reading = month_data.get('start_reading', 0)
-            consumption = month_data.get('total_consumption', 0)
-
-            # Track latest non-zero start reading
-            if start_reading != 0:
-                latest_start_reading = start_reading
-
-            total_consumption += consumption
-            total_entries += len(entries)
-
-            ws.cell(idx, 1, month_data['month_name']).border = self.border
-
-            start_cell = ws.cell(idx, 2, round(start_reading, 2))
-            start_cell.border = self.border
-
-            entries_cell = ws.cell(idx, 3, len(entries))
-            entries_cell.border = self.border
-
-            consumption_cell = ws.cell(idx, 4, round(consumption, 2))
-            consumption_cell.border = self.border
-            # Apply color coding for monthly consumption
-            fill = get_fill(consumption)
-            if fill:
-                consumption_cell.fill = fill
-                consumption_cell.font = get_font_color(consumption)
-
-            avg_cell = ws.cell(idx, 5, round(month_data.get('average_daily', 0), 2))
-            avg_cell.border = self.border
-
-        # Total row
-        total_row = 21
-        ws.cell(total_row, 1, "TOTAL").font = Font(bold=True)
-        ws.cell(total_row, 1).fill = self.accent_fill
-
-        start_total_cell = ws.cell(total_row, 2, round(latest_start_reading, 2))
-        start_total_cell.font = Font(bold=True)
-
-        entries_total_cell = ws.cell(total_row, 3, total_entries)
-        entries_total_cell.font = Font(bold=True)
-
-        consumption_total_cell = ws.cell(total_row, 4, round(total_consumption, 0))
-        consumption_total_cell.font = Font(bold=True)
-
-        # Set column widths
-        for col in ['A', 'B', 'C', 'D', 'E']:
-            ws.column_dimensions[col].width = 20
-        ws.column_dimensions['A'].width = 30
-
-        # Add legend/explanation for color coding starting at row 23
-        legend_start_row = 23
-       
-
-        ws.cell(legend_start_row + 1, 1, "≥ 200: Extreme consumption").fill = fills[200]
-        ws.cell(legend_start_row + 2, 1, "≥ 190: Very high consumption").fill = fills[190]
-        ws.cell(legend_start_row + 3, 1, "≥ 180: High consumption ").fill = fills[180]
-        ws.cell(legend_start_row + 4, 1, "≥ 170: Elevated consumption ").fill = fills[170]
-
-        # Adjust font color on legend cells for visibility
-        for r in range(legend_start_row + 1, legend_start_row + 5):
-            cell = ws.cell(r, 1)
-            if cell.fill == fills[190] or cell.fill == fills[200]:
-                cell.font = Font(color="FFFFFF")
-            else:
-                cell.font = Font(color="000000")
-        
-
-    def _create_monthly_sheet(self, wb, meter, month_data):
-        """Create individual monthly sheet with prettier formatting"""
-        try:
-            print(f"DEBUG: Creating sheet for month_data: {month_data}")
-            
-            sheet_name = f"{month_data['month_name']} {month_data['year']}"
-            print(f"DEBUG: Sheet name: {sheet_name}")
-            
-            ws = wb.create_sheet(sheet_name)
-            
-            entries = month_data.get('entries', [])
-            start_reading = month_data.get('start_reading', 0)
-            
-            print(f"DEBUG: Found {len(entries)} entries, start_reading: {start_reading}")
-            
-            # Row 1: Main Header - METER READING SHEET {MONTH} {YEAR}
-            ws['A1'] = f"METER READING BALANCE {month_data['month_name'].upper()} {month_data['year']}"
-            ws['A1'].font = Font(size=16, bold=True, color="004D40")
-            ws.merge_cells('A1:D1')
-            ws['A1'].alignment = Alignment(horizontal='center')
-            
-            # Row 2: Floor and Meter Information using helper function
-            if meter.name=="Second Floor Meter":
-                floor_info="SECOND FLOOR (SCY74980)"
-            else:
-                floor_info = "FIRST FLOOR (SAY39286)"
-            #floor_info = "First Floor Meter (SAY39286)" if meter.id!="fa76ead1-61a8-495d-8339-3abea2bf2740" else "Second Floor Meter (SCY74980)"
-            ws['A2'] = floor_info
-            print(floor_info)
-            ws['A2'].font = Font(size=12, bold=True, color="666666")
-            ws.merge_cells('A2:D2')
-            ws['A2'].alignment = Alignment(horizontal='center')
-            
-            # Add some spacing and summary info below row 2
-            ws['A4'] = f"Start Reading: {start_reading:.0f} units"
-            ws['A4'].font = Font(size=10, bold=True,color="666666")
-            ws['B4'] = f"Total Entries: {len(entries)}"
-            ws['B4'].font = Font(size=10,bold=True, color="666666")
-            ws['C4'] = f"Total Consumption: {month_data.get('total_consumption', 0):.0f} units"
-            ws['C4'].font = Font(size=10,bold=True, color="666666")
-            
-            if not entries:
-                print("DEBUG: No entries found for this month")
-                ws['A6'] = "No readings available for this month"
-                ws['A6'].font = Font(size=12, italic=True, color="999999")
-                return
-            
-            # Print first entry for debugging
-            print(f"DEBUG: First entry structure: {entries[0]}")
-            print(f"DEBUG: First entry type: {type(entries[0])}")
-            print(f"DEBUG: First entry attributes: {dir(entries[0])}")
-            
-            # Row 6: Table headers - starting from row 6 to give more space
-            headers = ["Posted Timestamp", "Reading Value", "Units"]
-            for idx, header in enumerate(headers, 1):
-                cell = ws.cell(6, idx, header)
-                cell.fill = self.header_fill
-                cell.font = self.header_font
-                cell.alignment = Alignment(horizontal='center')
-                cell.border = self.border
-            
-            # Sort entries by time (your entries have .time attribute)
-            try:
-                sorted_entries = sorted(entries, key=lambda x: x.time)
-               
-                print(f"DEBUG: Successfully sorted {len(sorted_entries)} entries")
-            except Exception as sort_error:
-                print(f"DEBUG: Error sorting entries: {sort_error}")
-                sorted_entries = entries  # Use unsorted if sorting fails
-            
-            prev_reading = start_reading
-            
-            # Data rows start from row 7
-            for idx, entry in enumerate(sorted_entries, 7):
-                try:
-                    print(f"DEBUG: Processing entry {idx-6}: {entry}")
-                    
-                    # Check if entry has required attributes
-                    if not hasattr(entry, 'time'):
-                        print(f"DEBUG: Entry missing 'time' attribute: {entry}")
-                        continue
-                    if not hasattr(entry, 'reading'):
-                        print(f"DEBUG: Entry missing 'reading' attribute: {entry}")
-                        continue
-                        
-                    change_from_prev = entry.reading - start_reading
-                    print(f"DEBUG: Change calculated: {change_from_prev}")
-                    
-                    # Show the actual timestamp when reading was posted
-                    try:
-                        timestamp_str = entry.time.strftime("%Y-%m-%d %I:%M:%S %p")
-
-                        print(f"DEBUG: Timestamp formatted: {timestamp_str}")
-                    except Exception as time_error:
-                        print(f"DEBUG: Error formatting time: {time_error}")
-                        timestamp_str = str(entry.time)
-                    
-                    ws.cell(idx, 1, timestamp_str).border = self.border
-                    ws.cell(idx, 2, round(entry.reading,0)).border = self.border
-
-                    cell = ws.cell(idx, 3, round(change_from_prev, 0))
-                    cell.border = self.border
-
-                    fill = get_fill(change_from_prev)
-                    if fill:
-                        cell.fill = fill
-                        cell.font = get_font_color(change_from_prev)
-                    
-                    
-                    
-                    
-                    # Add alternating row colors for better readability
-                    if idx % 2 == 0:  # Even rows
-                        fill = PatternFill(start_color="F8F9FA", end_color="F8F9FA", fill_type="solid")
-                        for col in range(1, 3):
-                            ws.cell(idx, col).fill = fill
-                    
-                    prev_reading = entry.reading
-                    print(f"DEBUG: Successfully processed entry {idx-6}")
-                    
-                except Exception as entry_error:
-                    print(f"DEBUG: Error processing entry {idx-6}: {entry_error}")
-                    print(f"DEBUG: Problem entry: {entry}")
-                    continue
-            
-            # Column widths - adjusted for prettier appearance
-            ws.column_dimensions['A'].width = 30  # Timestamp column wider
-            ws.column_dimensions['B'].width = 15  # Reading value
-            ws.column_dimensions['C'].width = 18  # Change from previous
-
-            
-            # Add borders around the entire data area
-            thin_border = Border(
-                left=Side(style='thin'),
-                right=Side(style='thin'),
-                top=Side(style='thin'),
-                bottom=Side(style='thin')
-            )
-            
-            # Apply border to header row
-            for col in range(1, 4):
-                ws.cell(6, col).border = thin_border
-            
-            print(f"DEBUG: Successfully completed sheet: {sheet_name}")
-            
-        except Exception as sheet_error:
-            print(f"DEBUG: ERROR in _create_monthly_sheet: {sheet_error}")
-            print(f"DEBUG: Sheet creation failed for month_data: {month_data}")
-            print(f"DEBUG: Error type: {type(sheet_error)}")
-            import traceback
-            print(f"DEBUG: Full traceback: {traceback.format_exc()}")
-            raise sheet_error  # Re-raise the caught exception
-
-def create_excel_export(meter_id: str, year: int) -> BytesIO:
+def create_excel_export(meter_id: str, year: int) -> SpooledTemporaryFile:
     """Main function to create Excel export - call this from your endpoint"""
+    # The export stack is loaded on first use, keeping it out of startup
+    import export_workbook
+
     # Get meter info
     meter = get_meter_by_id(meter_id)
     if not meter:
         raise HTTPException(status_code=404, detail=f"Meter {meter_id} not found")
     
     # Get yearly data
-    yearly_data = get_yearly_data_for_export(meter_id, year)
+    yearly_data = export_workbook.get_yearly_data_for_export(meter_id, year)
  
     # Generate Excel
-    excel_service = ExcelExportService()
-    excel_buffer = excel_service.create_yearly_excel(meter, yearly_data)
+    excel_service = export_workbook.ExcelExportService()
+    excel_file = excel_service.create_yearly_excel(meter, yearly_data)
     
-    return excel_buffer
+    return excel_file
+
+def render_export(meter_id: str, year: int) -> bytes:
+    """create_excel_export as bytes, for archive workers in other processes"""
+    with create_excel_export(meter_id, year) as excel_file:
+        return excel_file.read()
+
+def get_export_meters(
+    household_token: str | None = None,
+    meter_ids: list[str] | None = None,
+    sess: Session | None = None,
+) -> list[tuple[UUID, str]]:
+    """
+    (id, name) of the meters to export, by name: a household's meters, the
+    given meters, or the given meters within a household.
+    """
+    query = select(models.Meter.id, models.Meter.name).order_by(models.Meter.name, models.Meter.id)
+    if household_token is not None:
+        query = query.where(models.Meter.household_token == household_token)
+    if meter_ids:
+        try:
+            wanted = {UUID(str(meter_id)) for meter_id in meter_ids}
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid meter id")
+        query = query.where(models.Meter.id.in_(wanted))
+    with session_scope(sess) as sess:
+        meters = sess.exec(query).all()
+    if meter_ids:
+        missing = wanted - {meter_id for meter_id, _ in meters}
+        if missing:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Meters not found: {', '.join(sorted(map(str, missing)))}",
+            )
+    return meters
+
+def household_etag(household_token: str) -> str:
+    """
+    ETag for the household's meter list and summary. It also changes with
+    the calendar month, and every READ_CACHE_TTL seconds so meters added
+    outside the API (add_meter.py) are picked up as the read cache is.
+    """
+    return read_cache.etag(household_token, f"{datetime.date.today():%Y%m}", _ttl_bucket())
+
+def monthly_etag(meter_id, year: int, month: int) -> str:
+    """
+    ETag for a meter/month's start reading and entries. Versions are kept
+    per process, so like household_etag it also turns over every
+    READ_CACHE_TTL seconds to pick up writes made by other workers.
+    """
+    return read_cache.etag(_month_scope(meter_id, year, month), _ttl_bucket())
 
-def get_summary(household_token: str) -> schemas.HomeSummary:
+def _ttl_bucket() -> int:
+    return int(time.time() // read_cache.ttl) if read_cache.ttl else 0
+
+def _month_scope(meter_id, year: int, month: int) -> str:
+    try:
+        meter_id = UUID(str(meter_id))
+    except ValueError:
+        pass
+    return f"{meter_id}:{year}-{month:02d}"
+
+def _refreshed_state(
+    sess: Session, household_token: str | None, meter_id, year: int, month: int
+) -> schemas.RefreshedState:
+    """
+    Read back a write's month and household summary before it commits, so
+    the caller gets exactly what the transaction wrote. The read cache is
+    bypassed: it still holds the pre-write version.
+    """
+    return schemas.RefreshedState(
+        monthly=get_monthly_data(meter_id, year, month, sess=sess),
+        summary=get_summary(household_token, sess=sess, cached=False),
+    )
+
+def _invalidate_reads(household_token: str | None, meter_id, year: int, month: int):
+    read_cache.invalidate(_month_scope(meter_id, year, month))
+    if household_token:
+        read_cache.invalidate(household_token)
+
+def get_summary(
+    household_token: str, sess: Session | None = None, cached: bool = True
+) -> schemas.HomeSummary:
     """
     Return aggregated summary for a household.
     """
-    meters = get_meters(household_token)
+    meters = get_meters(household_token, sess=sess, cached=cached)
     home_total = sum(m.total_units for m in meters)
     home_current = sum(m.current_month_units for m in meters)
     return schemas.HomeSummary(
@@ -519,12 +221,14 @@ def get_summary(household_token: str) -> schemas.HomeSummary:
     )
 
 
-def get_monthly_data(meter_id: str, year: int, month: int) -> schemas.MonthlyData:
+def get_monthly_data(
+    meter_id: str, year: int, month: int, sess: Session | None = None
+) -> schemas.MonthlyData:
     """
     Return the start reading and list of entries for a given meter/year/month.
     Each entry includes date, full timestamp, reading, and poster name.
     """
-    with Session(engine) as sess:
+    with session_scope(sess) as sess:
         # 1) Fetch or default start reading
         sr = sess.exec(
             select(models.StartReading).where(
@@ -550,7 +254,7 @@ def get_monthly_data(meter_id: str, year: int, month: int) -> schemas.MonthlyDat
                 models.Reading.reading_date >= first_day,
                 models.Reading.reading_date < next_month,
             )
-            .order_by(models.Reading.reading_time.desc())
+            .order_by(models.Reading.reading_time.desc(), models.Reading.id.desc())
         ).all()
        
         return schemas.MonthlyData(
@@ -568,11 +272,302 @@ def get_monthly_data(meter_id: str, year: int, month: int) -> schemas.MonthlyDat
         )
 
 
-def set_start_reading(meter_id: str, year: int, month: int, reading: float):
+# Fields a range read can project, by output name
+reading_fields = {
+    "id": models.Reading.id,
+    "date": models.Reading.reading_date,
+    "time": models.Reading.reading_time,
+    "reading": models.Reading.reading_value,
+    "posted_by": models.Reading.posted_by,
+}
+
+# Stored times are Pakistan wall-clock time without an offset. The columnar
+# formats send them as Unix seconds using this fixed offset (no DST there).
+PK_OFFSET_SECONDS = int(models.PK_TZ.utcoffset(datetime.datetime(2000, 1, 1)).total_seconds())
+_EPOCH = datetime.datetime(1970, 1, 1)
+_EPOCH_DAY = _EPOCH.date().toordinal()
+
+# How each field is sent in the columnar formats: dates as days and times
+# as seconds since the Unix epoch
+column_encoders = {
+    "id": str,
+    "date": lambda d: d.toordinal() - _EPOCH_DAY,
+    "time": lambda t: int((t - _EPOCH).total_seconds()) - PK_OFFSET_SECONDS,
+    "reading": float,
+    "posted_by": str,
+}
+
+def to_columns(fields: list[str], rows) -> dict[str, list]:
+    """Rows of `fields` values as one encoded list per field."""
+    columns = list(zip(*rows)) if rows else [()] * len(fields)
+    return {f: list(map(column_encoders[f], column)) for f, column in zip(fields, columns)}
+
+def get_monthly_columns(meter_id: str, year: int, month: int, sess: Session | None = None) -> dict:
+    """
+    get_monthly_data as parallel arrays of entry fields, newest first, read
+    as plain rows without building a model per entry.
+    """
+    first_day = datetime.date(year, month, 1)
+    next_month = datetime.date(year + month // 12, month % 12 + 1, 1)
+    fields = ["id", "date", "time", "reading"]
+    with session_scope(sess) as sess:
+        start_val = sess.exec(
+            select(models.StartReading.reading_value).where(
+                models.StartReading.meter_id == meter_id,
+                models.StartReading.year == year,
+                models.StartReading.month == month,
+            )
+        ).one_or_none()
+        rows = sess.exec(
+            select(*(reading_fields[f] for f in fields))
+            .where(
+                models.Reading.meter_id == meter_id,
+                models.Reading.reading_date >= first_day,
+                models.Reading.reading_date < next_month,
+            )
+            .order_by(models.Reading.reading_time.desc(), models.Reading.id.desc())
+        ).all()
+    return {
+        "start_reading": start_val or 0.0,
+        "utc_offset": PK_OFFSET_SECONDS,
+        "entries": to_columns(fields, rows),
+    }
+
+def encode_cursor(reading_time: datetime.datetime, reading_id) -> str:
+    raw = f"{reading_time.isoformat()}|{reading_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str) -> tuple[datetime.datetime, UUID]:
+    try:
+        reading_time, reading_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return models.pk_wall_clock(datetime.datetime.fromisoformat(reading_time)), UUID(reading_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _readings_page(
+    meter_id: str,
+    start: datetime.datetime | None,
+    end: datetime.datetime | None,
+    after: str | None,
+    limit: int,
+    fields: list[str] | None,
+    sess: Session | None,
+) -> tuple[list[str], list, str | None]:
+    """(fields, rows of their values, next cursor) for one page of readings."""
+    fields = fields or list(reading_fields)
+    unknown = [f for f in fields if f not in reading_fields]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+
+    query = (
+        select(models.Reading.reading_time, models.Reading.id, *(reading_fields[f] for f in fields))
+        .where(models.Reading.meter_id == meter_id)
+        .order_by(models.Reading.reading_time, models.Reading.id)
+        .limit(limit + 1)
+    )
+    # reading_time is naive Pakistan time; bounds with an offset are converted
+    if start is not None:
+        query = query.where(models.Reading.reading_time >= models.pk_wall_clock(start))
+    if end is not None:
+        query = query.where(models.Reading.reading_time < models.pk_wall_clock(end))
+    if after is not None:
+        after_time, after_id = decode_cursor(after)
+        query = query.where(
+            tuple_(models.Reading.reading_time, models.Reading.id) > tuple_(after_time, after_id)
+        )
+
+    with session_scope(sess) as sess:
+        rows = sess.exec(query).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][0], rows[-1][1])
+    return fields, [row[2:] for row in rows], next_cursor
+
+def get_readings_page(
+    meter_id: str,
+    start: datetime.datetime | None = None,
+    end: datetime.datetime | None = None,
+    after: str | None = None,
+    limit: int = 500,
+    fields: list[str] | None = None,
+    sess: Session | None = None,
+) -> schemas.ReadingPage:
+    """
+    One page of a meter's readings with start <= reading_time < end, oldest
+    first. Pages are keyed on (reading_time, id) rather than offsets, so
+    each page is an index range scan however deep into the history it is.
+    """
+    fields, rows, next_cursor = _readings_page(meter_id, start, end, after, limit, fields, sess)
+    return schemas.ReadingPage(
+        readings=[dict(zip(fields, row)) for row in rows],
+        next_cursor=next_cursor,
+    )
+
+def get_readings_columns(
+    meter_id: str,
+    start: datetime.datetime | None = None,
+    end: datetime.datetime | None = None,
+    after: str | None = None,
+    limit: int = 500,
+    fields: list[str] | None = None,
+    sess: Session | None = None,
+) -> dict:
+    """get_readings_page with the readings as parallel arrays, as get_monthly_columns."""
+    fields, rows, next_cursor = _readings_page(meter_id, start, end, after, limit, fields, sess)
+    return {
+        "readings": to_columns(fields, rows),
+        "utc_offset": PK_OFFSET_SECONDS,
+        "next_cursor": next_cursor,
+    }
+
+
+consumption_buckets = ("day", "week", "month", "year")
+
+def get_consumption(
+    bucket: str,
+    meter_id: str | None = None,
+    household_token: str | None = None,
+    start: datetime.date | None = None,
+    end: datetime.date | None = None,
+    sess: Session | None = None,
+) -> schemas.ConsumptionSeries:
+    """
+    Units consumed per day, week, month or year for one meter or all of a
+    household's meters, with start <= bucket start < end.
+
+    A month's consumption runs from its start reading, or the meter's last
+    reading before the month if it has none, so start reading resets are
+    respected. Months and years are summed from the monthly rollups; days
+    and weeks from the readings themselves. Either way it happens in SQL.
+    """
+    if bucket not in consumption_buckets:
+        raise HTTPException(status_code=400, detail=f"bucket must be one of {', '.join(consumption_buckets)}")
+
+    with session_scope(sess) as sess:
+        if bucket in ("month", "year"):
+            rows = _rollup_consumption(sess, bucket, meter_id, household_token)
+        else:
+            rows = _reading_consumption(sess, bucket, meter_id, household_token, start, end)
+
+    buckets = []
+    for bucket_day, units in rows:
+        if isinstance(bucket_day, str):
+            bucket_day = datetime.date.fromisoformat(bucket_day)
+        elif isinstance(bucket_day, datetime.datetime):
+            bucket_day = bucket_day.date()
+        if (start and bucket_day < start) or (end and bucket_day >= end):
+            continue
+        buckets.append(schemas.ConsumptionBucket(start=bucket_day, units=units or 0.0))
+    return schemas.ConsumptionSeries(bucket=bucket, buckets=buckets)
+
+def _rollup_consumption(sess: Session, bucket: str, meter_id, household_token) -> list[tuple]:
+    """(first day, units) per month or year, from one row per meter/month."""
+    rollup = models.MonthlyRollup
+    previous = func.lag(rollup.latest_value).over(
+        partition_by=rollup.meter_id, order_by=(rollup.year, rollup.month)
+    )
+    months = select(
+        rollup.year,
+        rollup.month,
+        (
+            rollup.latest_value
+            - func.coalesce(rollup.start_value, previous, rollup.latest_value)
+        ).label("units"),
+    ).where(rollup.entry_count > 0)
+    if meter_id is not None:
+        months = months.where(rollup.meter_id == meter_id)
+    if household_token is not None:
+        months = months.join(models.Meter, models.Meter.id == rollup.meter_id).where(
+            models.Meter.household_token == household_token
+        )
+    months = months.subquery()
+
+    group = (months.c.year,) if bucket == "year" else (months.c.year, months.c.month)
+    rows = sess.exec(select(*group, func.sum(months.c.units)).group_by(*group).order_by(*group)).all()
+    if bucket == "year":
+        return [(datetime.date(year, 1, 1), units) for year, units in rows]
+    return [(datetime.date(year, month, 1), units) for year, month, units in rows]
+
+def _reading_consumption(
+    sess: Session, bucket: str, meter_id, household_token, start, end
+) -> list[tuple]:
+    """
+    (first day, units) per day or week. Each reading contributes its rise
+    over the previous reading of the same meter and month (LAG), or over
+    the month's start reading for the first one.
+    """
+    reading = models.Reading
+    previous = func.lag(reading.reading_value).over(
+        partition_by=(reading.meter_id, reading.reading_date),
+        order_by=(reading.reading_time, reading.id),
+    )
+    previous_any = func.lag(reading.reading_value).over(
+        partition_by=reading.meter_id,
+        order_by=(reading.reading_date, reading.reading_time, reading.id),
+    )
+    if sess.get_bind().dialect.name == "postgresql":
+        bucket_start = func.date_trunc(bucket, reading.reading_time)
+    elif bucket == "week":
+        # SQLite, for local runs: back to the Monday, as date_trunc does
+        bucket_start = func.date(reading.reading_time, "weekday 0", "-6 days")
+    else:
+        bucket_start = func.date(reading.reading_time)
+
+    rises = select(
+        bucket_start.label("bucket_start"),
+        (
+            reading.reading_value
+            - func.coalesce(
+                previous, models.StartReading.reading_value, previous_any, reading.reading_value
+            )
+        ).label("units"),
+    ).outerjoin(
+        models.StartReading,
+        and_(
+            models.StartReading.meter_id == reading.meter_id,
+            models.StartReading.year == extract("year", reading.reading_date),
+            models.StartReading.month == extract("month", reading.reading_date),
+        ),
+    )
+    if meter_id is not None:
+        rises = rises.where(reading.meter_id == meter_id)
+    if household_token is not None:
+        rises = rises.join(models.Meter, models.Meter.id == reading.meter_id).where(
+            models.Meter.household_token == household_token
+        )
+    # Whole months (and the one before, for months without a start
+    # reading), so LAG sees every reading it needs
+    if start is not None:
+        rises = rises.where(reading.reading_date >= _previous_month(start))
+    if end is not None:
+        rises = rises.where(reading.reading_date < end)
+    rises = rises.subquery()
+
+    return sess.exec(
+        select(rises.c.bucket_start, func.sum(rises.c.units))
+        .group_by(rises.c.bucket_start)
+        .order_by(rises.c.bucket_start)
+    ).all()
+
+
+def set_start_reading(
+    meter_id: str,
+    year: int,
+    month: int,
+    reading: float,
+    sess: Session | None = None,
+    refresh: bool = False,
+) -> schemas.RefreshedState | None:
     """
     Explicitly set or reset the start reading for a meter/month.
+    With refresh=True, return the month and household summary as written.
     """
-    with Session(engine) as sess:
+    with session_scope(sess) as sess:
+        # Writes to a meter lock its row first, so concurrent ones queue up
+        # instead of racing to create the same start, rollup or stats row
+        meter = sess.get(models.Meter, meter_id, with_for_update=True)
         # Delete existing if any
         existing = sess.exec(
             select(models.StartReading).where(
@@ -583,14 +578,30 @@ def set_start_reading(meter_id: str, year: int, month: int, reading: float):
         ).all()
         for sr in existing:
             sess.delete(sr)
-        sess.commit()
+        # Flush the delete first so the insert below does not hit the
+        # unique (meter_id, year, month) index; both commit together
+        sess.flush()
 
         # Add new
         sr = models.StartReading(
             meter_id=meter_id, year=year, month=month, reading_value=reading
         )
         sess.add(sr)
+        rollup = _rollup_for_update(sess, meter_id, year, month)
+        rollup.start_value = reading
+        rollup.refresh_consumption()
+        stats = _stats_for_update(sess, meter_id)
+        if stats is not None and (stats.year, stats.month) == (year, month):
+            if stats.last_time == datetime.datetime(year, month, 1):
+                anomalies.start_month(stats, year, month, reading)
+            else:
+                stats.start_value = reading
+        household_token = meter.household_token if meter else None
+        state = _refreshed_state(sess, household_token, meter_id, year, month) if refresh else None
         sess.commit()
+    data_versions.bump(meter_id, year)
+    _invalidate_reads(household_token, meter_id, year, month)
+    return state
 
 
 def add_reading(
@@ -598,13 +609,21 @@ def add_reading(
     reading_date: datetime.date,
     reading_val: float,
     posted_by: str,
-    reading_time: datetime.datetime
-) -> int:
-    
+    reading_time: datetime.datetime,
+    sess: Session | None = None,
+    refresh: bool = False,
+) -> int | tuple[int, schemas.RefreshedState]:
+    """
+    Insert a reading and return its danger level. With refresh=True,
+    return (level, state) where state is the month and household summary
+    as written.
+    """
     reading_date = reading_date.replace(day=1)
     
-    with Session(engine) as sess:
-        m = sess.get(models.Meter, meter_id)
+    with session_scope(sess) as sess:
+        # Locked as in set_start_reading: the first readings for a meter
+        # or month create its stats and rollup rows
+        m = sess.get(models.Meter, meter_id, with_for_update=True)
         if not m:
             raise HTTPException(status_code=404, detail="Meter not found")
 
@@ -657,17 +676,7 @@ def add_reading(
         #     )
 
         # Enforce freeze on primary meter
-        new_total = reading_val - start_val
-
-        level = 0
-        if new_total > 200:
-            level = 4
-        elif new_total > 190:
-            level = 3
-        elif new_total > 180:
-            level = 2
-        elif new_total > 170:
-            level = 1
+        level = models.threshold_level(reading_val - start_val)
 
         # Insert reading
         r = models.Reading(
@@ -678,12 +687,163 @@ def add_reading(
             reading_time=reading_time,
         )
         sess.add(r)
+        rollup = _rollup_for_update(sess, m.id, y, mo)
+        # A rollup created here has no start yet; the bulk path does the same
+        rollup.start_value = start_val
+        rollup.entry_count += 1
+        if _is_latest(sess, rollup, reading_time, r.id):
+            rollup.latest_value = reading_val
+            rollup.latest_time = reading_time
+        rollup.refresh_consumption()
+        _observe_readings(sess, m.id, [(y, mo, reading_time, reading_val, start_val, r.id)])
+        household_token = m.household_token
+        state = _refreshed_state(sess, household_token, meter_id, y, mo) if refresh else None
         sess.commit()
-        return level
+        data_versions.bump(meter_id, y)
+        _invalidate_reads(household_token, meter_id, y, mo)
+        return (level, state) if refresh else level
 
 
-def has_start_reading(meter_id: str, year: int, month: int) -> bool:
-    with Session(engine) as sess:
+def add_readings_bulk(
+    household_token: str, rows: list[dict], sess: Session | None = None
+) -> schemas.BulkResult:
+    """
+    Insert many readings for a household's meters in one transaction.
+
+    Meters and start readings are checked for all rows with one query each,
+    valid rows go in as a single executemany insert and rollups are updated
+    once per touched month. Invalid rows are skipped and reported by index.
+    """
+    errors: list[schemas.BulkRowError] = []
+    levels: list[int | None] = [None] * len(rows)
+    parsed: list[tuple[int, schemas.BulkReadingIn]] = []
+    for i, row in enumerate(rows):
+        try:
+            parsed.append((i, schemas.BulkReadingIn.model_validate(row)))
+        except ValidationError as e:
+            problem = e.errors()[0]
+            field = ".".join(str(p) for p in problem["loc"])
+            detail = f"{field}: {problem['msg']}" if field else problem["msg"]
+            errors.append(schemas.BulkRowError(row=i, detail=detail))
+
+    default_time = datetime.datetime.now(models.PK_TZ).replace(tzinfo=None)
+    meter_ids = {r.meter_id for _, r in parsed}
+    years = {r.date.year for _, r in parsed}
+
+    with session_scope(sess) as sess:
+        known_meters = set()
+        if meter_ids:
+            known_meters = set(sess.exec(
+                select(models.Meter.id).where(
+                    models.Meter.id.in_(meter_ids),
+                    models.Meter.household_token == household_token,
+                )
+                # Locked as in add_reading, in id order so that bulk
+                # uploads sharing meters cannot deadlock
+                .order_by(models.Meter.id)
+                .with_for_update()
+            ).all())
+        starts = {}
+        if known_meters:
+            starts = {
+                (sr_meter, sr_year, sr_month): sr_value
+                for sr_meter, sr_year, sr_month, sr_value in sess.exec(
+                    select(
+                        models.StartReading.meter_id,
+                        models.StartReading.year,
+                        models.StartReading.month,
+                        models.StartReading.reading_value,
+                    ).where(
+                        models.StartReading.meter_id.in_(known_meters),
+                        models.StartReading.year.in_(years),
+                    )
+                )
+            }
+
+        inserts = []
+        accepted, units = [], []
+        observed: dict[UUID, list[tuple]] = {}
+        months: dict[tuple, list] = {}
+        for i, r in parsed:
+            if r.meter_id not in known_meters:
+                errors.append(schemas.BulkRowError(row=i, detail="Meter not found"))
+                continue
+            key = (r.meter_id, r.date.year, r.date.month)
+            if key not in starts:
+                errors.append(schemas.BulkRowError(
+                    row=i,
+                    detail=f"Start reading not set for {r.date.year}-{r.date.month}.",
+                ))
+                continue
+            accepted.append(i)
+            units.append(r.reading - starts[key])
+            # Rows without a time get distinct, increasing ones in upload
+            # order, so the month's latest reading is well defined
+            reading_time = r.time or default_time + datetime.timedelta(microseconds=i)
+            reading_id = uuid4()
+            observed.setdefault(r.meter_id, []).append(
+                (r.date.year, r.date.month, reading_time, r.reading, starts[key], reading_id)
+            )
+            inserts.append({
+                "id": reading_id,
+                "meter_id": r.meter_id,
+                "reading_date": r.date.replace(day=1),
+                "reading_time": reading_time,
+                "reading_value": r.reading,
+                "posted_by": r.name,
+            })
+            # [count, (latest_time, id), latest_value] for the rollup; ties
+            # on time go to the higher id, as in compute_rollups
+            month = months.setdefault(key, [0, None, None])
+            month[0] += 1
+            if month[1] is None or (reading_time, reading_id) > month[1]:
+                month[1], month[2] = (reading_time, reading_id), r.reading
+
+        import analytics  # pandas, loaded on first use
+
+        for i, level in zip(accepted, analytics.levels(units).tolist()):
+            levels[i] = level
+
+        if inserts:
+            sess.exec(insert(models.Reading.__table__), params=inserts)
+            rollups = {
+                (ru.meter_id, ru.year, ru.month): ru
+                for ru in sess.exec(
+                    select(models.MonthlyRollup)
+                    .where(
+                        models.MonthlyRollup.meter_id.in_({k[0] for k in months}),
+                        models.MonthlyRollup.year.in_({k[1] for k in months}),
+                    )
+                    .with_for_update()
+                )
+            }
+            for key, (count, (latest_time, latest_id), latest_value) in months.items():
+                rollup = rollups.get(key)
+                if rollup is None:
+                    rollup = models.MonthlyRollup(meter_id=key[0], year=key[1], month=key[2])
+                    rollup.start_value = starts[key]
+                    sess.add(rollup)
+                rollup.entry_count += count
+                if _is_latest(sess, rollup, latest_time, latest_id):
+                    rollup.latest_value = latest_value
+                    rollup.latest_time = latest_time
+                rollup.refresh_consumption()
+            for meter_id, readings in observed.items():
+                readings.sort(key=lambda reading: (reading[2], reading[5]))
+                _observe_readings(sess, meter_id, readings)
+            sess.commit()
+
+    for meter_id, year, month in months:
+        data_versions.bump(meter_id, year)
+        _invalidate_reads(household_token, meter_id, year, month)
+    errors.sort(key=lambda e: e.row)
+    return schemas.BulkResult(inserted=len(inserts), levels=levels, errors=errors)
+
+
+def has_start_reading(
+    meter_id: str, year: int, month: int, sess: Session | None = None
+) -> bool:
+    with session_scope(sess) as sess:
         exists = sess.exec(
             select(models.StartReading).where(
                 models.StartReading.meter_id == meter_id,
@@ -693,14 +853,463 @@ def has_start_reading(meter_id: str, year: int, month: int) -> bool:
         ).first()
         return exists is not None
 
-def delete_entry(entry_id: str):
-    with Session(engine) as sess:
+def delete_entry(
+    entry_id: str, sess: Session | None = None, refresh: bool = False
+) -> schemas.RefreshedState | None:
+    """
+    Delete a reading. With refresh=True, return the month and household
+    summary as left by the delete.
+    """
+    with session_scope(sess) as sess:
         entry = sess.get(models.Reading, entry_id)
         if not entry:
             raise HTTPException(status_code=404, detail="Entry not found")
+        meter_id, reading_date = entry.meter_id, entry.reading_date
+        # Locked as in add_reading, before its rollup and stats rows
+        meter = sess.get(models.Meter, meter_id, with_for_update=True)
+        sess.exec(delete(models.MeterAlert).where(models.MeterAlert.reading_id == entry.id))
+        rollup = _rollup_for_update(sess, meter_id, reading_date.year, reading_date.month)
+        was_latest = entry.reading_time == rollup.latest_time
         sess.delete(entry)
+        sess.flush()
+        rollup.entry_count = max(rollup.entry_count - 1, 0)
+        if was_latest:
+            # The month's latest reading went away: find the new latest
+            latest = sess.exec(
+                select(models.Reading.reading_value, models.Reading.reading_time)
+                .where(
+                    models.Reading.meter_id == meter_id,
+                    models.Reading.reading_date >= reading_date.replace(day=1),
+                    models.Reading.reading_date < _next_month(reading_date),
+                )
+                .order_by(models.Reading.reading_time.desc(), models.Reading.id.desc())
+                .limit(1)
+            ).first()
+            rollup.latest_value, rollup.latest_time = latest or (None, None)
+        rollup.refresh_consumption()
+        # The running stats cannot take a reading back out, so they are
+        # recomputed as if it had never been added
+        stats = _stats_for_update(sess, meter_id)
+        if stats is not None:
+            replayed = _replay_stats(sess, meter_id)
+            if replayed is None:
+                sess.delete(stats)
+            else:
+                for field in models.MeterStats.model_fields:
+                    setattr(stats, field, getattr(replayed, field))
+        household_token = meter.household_token
+        state = (
+            _refreshed_state(sess, household_token, meter_id, reading_date.year, reading_date.month)
+            if refresh
+            else None
+        )
         sess.commit()
+    data_versions.bump(meter_id, reading_date.year)
+    _invalidate_reads(household_token, meter_id, reading_date.year, reading_date.month)
+    return state
+
+
+# Monthly rollups: one row per meter/month, updated in the same transaction
+# as every write to readings or start readings.
+
+def _previous_month(day: datetime.date) -> datetime.date:
+    return (day.replace(day=1) - datetime.timedelta(days=1)).replace(day=1)
+
+def _next_month(day: datetime.date) -> datetime.date:
+    if day.month == 12:
+        return datetime.date(day.year + 1, 1, 1)
+    return datetime.date(day.year, day.month + 1, 1)
+
+def _rollup_for_update(sess: Session, meter_id, year: int, month: int) -> models.MonthlyRollup:
+    """Lock the meter/month rollup row, creating it if missing."""
+    meter_id = UUID(str(meter_id))
+    rollup = sess.exec(
+        select(models.MonthlyRollup)
+        .where(
+            models.MonthlyRollup.meter_id == meter_id,
+            models.MonthlyRollup.year == year,
+            models.MonthlyRollup.month == month,
+        )
+        .with_for_update()
+    ).one_or_none()
+    if rollup is None:
+        rollup = models.MonthlyRollup(meter_id=meter_id, year=year, month=month)
+        sess.add(rollup)
+    return rollup
+
+def _is_latest(sess: Session, rollup: models.MonthlyRollup, reading_time, reading_id) -> bool:
+    """
+    Whether a reading just written to the rollup's month is now its
+    latest, ordering by (reading_time, id) as compute_rollups does.
+    """
+    if rollup.latest_time is None or reading_time > rollup.latest_time:
+        return True
+    if reading_time < rollup.latest_time:
+        return False
+    # Same time as the latest so far: the highest id wins
+    first_day = datetime.date(rollup.year, rollup.month, 1)
+    return sess.exec(
+        select(models.Reading.id)
+        .where(
+            models.Reading.meter_id == rollup.meter_id,
+            models.Reading.reading_date >= first_day,
+            models.Reading.reading_date < _next_month(first_day),
+            models.Reading.reading_time == reading_time,
+        )
+        .order_by(models.Reading.id.desc())
+        .limit(1)
+    ).first() == reading_id
+
+# Anomaly detection: running per-meter stats, updated in the same
+# transaction as each reading insert.
+
+def _stats_for_update(sess: Session, meter_id) -> models.MeterStats | None:
+    return sess.exec(
+        select(models.MeterStats)
+        .where(models.MeterStats.meter_id == UUID(str(meter_id)))
+        .with_for_update()
+    ).one_or_none()
+
+def _observe_readings(sess: Session, meter_id, readings: list[tuple]):
+    """
+    Fold (year, month, reading_time, value, start_value, reading_id)
+    readings, oldest first, into the meter's stats and store any alerts
+    they raise.
+    """
+    meter_id = UUID(str(meter_id))
+    stats = _stats_for_update(sess, meter_id)
+    if stats is None:
+        year, month, _, _, start_value, _ = readings[0]
+        stats = anomalies.new_stats(meter_id, year, month, start_value)
+        sess.add(stats)
+    for year, month, reading_time, value, start_value, reading_id in readings:
+        for kind, detail in anomalies.observe(stats, year, month, reading_time, value, start_value):
+            sess.add(models.MeterAlert(
+                meter_id=meter_id,
+                reading_id=reading_id,
+                kind=kind,
+                detail=detail,
+                reading_value=value,
+                reading_time=reading_time,
+            ))
+
+def _replay_stats(sess: Session, meter_id) -> models.MeterStats | None:
+    """
+    The meter's stats recomputed from scratch: all its readings folded in
+    again, oldest first, without storing the alerts. None if it has no
+    readings left.
+    """
+    starts = dict(
+        ((year, month), value)
+        for year, month, value in sess.exec(
+            select(models.StartReading.year, models.StartReading.month, models.StartReading.reading_value)
+            .where(models.StartReading.meter_id == meter_id)
+        )
+    )
+    stats = None
+    for reading_date, reading_time, value in sess.exec(
+        select(models.Reading.reading_date, models.Reading.reading_time, models.Reading.reading_value)
+        .where(models.Reading.meter_id == meter_id)
+        .order_by(models.Reading.reading_time, models.Reading.id)
+    ):
+        year, month = reading_date.year, reading_date.month
+        start_value = starts.get((year, month), 0.0)
+        if stats is None:
+            stats = anomalies.new_stats(UUID(str(meter_id)), year, month, start_value)
+        anomalies.observe(stats, year, month, reading_time, value, start_value)
+    return stats
+
+# Days the insights' recent daily average is taken over
+ROLLING_DAYS = 7
+
+def get_insights(
+    household_token: str, alert_limit: int = 10, sess: Session | None = None
+) -> list[schemas.MeterInsight]:
+    """
+    Running stats, the average daily units over the last ROLLING_DAYS days
+    of this month and the latest alerts for each of a household's meters.
+    """
+    import analytics  # pandas, loaded on first use
+
+    today = datetime.date.today()
+    with session_scope(sess) as sess:
+        rows = sess.exec(
+            select(models.Meter.id, models.Meter.name, models.MeterStats)
+            .outerjoin(models.MeterStats, models.MeterStats.meter_id == models.Meter.id)
+            .where(models.Meter.household_token == household_token)
+        ).all()
+        meter_ids = [meter_id for meter_id, _, _ in rows]
+        readings = analytics.load_month_readings(sess, meter_ids, today.year, today.month)
+        starts = analytics.load_month_starts(sess, meter_ids, today.year, today.month)
+        # Latest `alert_limit` alerts per meter
+        newest_first = func.row_number().over(
+            partition_by=models.MeterAlert.meter_id,
+            order_by=models.MeterAlert.reading_time.desc(),
+        ).label("position")
+        recent = (
+            select(models.MeterAlert, newest_first)
+            .where(models.MeterAlert.meter_id.in_(meter_ids))
+            .subquery()
+        )
+        latest_alerts = aliased(models.MeterAlert, recent)
+        alerts = sess.exec(
+            select(latest_alerts)
+            .where(recent.c.position <= alert_limit)
+            .order_by(recent.c.position)
+        ).all()
+
+    recent_daily: dict[UUID, float] = {}
+    for meter_id, frame in readings.groupby("meter_id"):
+        frame = analytics.add_month_columns(frame, {today.month: starts.get(meter_id, 0.0)})
+        daily = analytics.rolling_daily(frame, ROLLING_DAYS, end=today)
+        recent_daily[meter_id] = float(daily["rolling_mean"].iloc[-1])
+
+    by_meter: dict[UUID, list[schemas.AlertOut]] = {}
+    for alert in alerts:
+        by_meter.setdefault(alert.meter_id, []).append(schemas.AlertOut(
+            kind=alert.kind,
+            detail=alert.detail,
+            reading=alert.reading_value,
+            time=alert.reading_time,
+        ))
+
+    return [
+        schemas.MeterInsight(
+            meter_id=meter_id,
+            name=name,
+            year=stats.year if stats else None,
+            month=stats.month if stats else None,
+            units_so_far=stats.last_value - stats.start_value if stats else 0.0,
+            daily_rate=stats.daily_rate if stats else None,
+            projected_units=stats.projected_units if stats else None,
+            projected_band=stats.projected_band if stats else 0,
+            recent_daily_units=recent_daily.get(meter_id),
+            alerts=by_meter.get(meter_id, []),
+        )
+        for meter_id, name, stats in rows
+    ]
+
+def compute_rollups(sess: Session, meter_id: str | None = None) -> dict[tuple, models.MonthlyRollup]:
+    """Recompute rollups from the raw tables, keyed by (meter_id, year, month)."""
+    starts = select(models.StartReading)
+    readings = (
+        select(
+            models.Reading.meter_id,
+            models.Reading.reading_date,
+            models.Reading.reading_time,
+            models.Reading.reading_value,
+        )
+        .order_by(models.Reading.meter_id, models.Reading.reading_time, models.Reading.id)
+        .execution_options(yield_per=10000)
+    )
+    if meter_id is not None:
+        starts = starts.where(models.StartReading.meter_id == meter_id)
+        readings = readings.where(models.Reading.meter_id == meter_id)
+
+    rollups: dict[tuple, models.MonthlyRollup] = {}
+
+    def rollup_for(key):
+        if key not in rollups:
+            rollups[key] = models.MonthlyRollup(meter_id=key[0], year=key[1], month=key[2])
+        return rollups[key]
+
+    for sr in sess.exec(starts):
+        rollup_for((sr.meter_id, sr.year, sr.month)).start_value = sr.reading_value
+    # Ordered by time, so the last reading seen for a month is its latest
+    for r_meter, r_date, r_time, r_value in sess.exec(readings):
+        rollup = rollup_for((r_meter, r_date.year, r_date.month))
+        rollup.entry_count += 1
+        rollup.latest_value = r_value
+        rollup.latest_time = r_time
+    for rollup in rollups.values():
+        rollup.refresh_consumption()
+    return rollups
+
+def rebuild_rollups(meter_id: str | None = None) -> int:
+    """Replace stored rollups with ones recomputed from raw data (backfill)."""
+    with Session(engine) as sess:
+        delete = models.MonthlyRollup.__table__.delete()
+        if meter_id is not None:
+            delete = delete.where(models.MonthlyRollup.meter_id == meter_id)
+        sess.exec(delete)
+        rollups = compute_rollups(sess, meter_id)
+        sess.add_all(rollups.values())
+        sess.commit()
+        return len(rollups)
+
+def ensure_rollups():
+    """Backfill rollups once on a database that predates the rollup table."""
+    with Session(engine) as sess:
+        if sess.exec(select(models.MonthlyRollup).limit(1)).first() is not None:
+            return
+        if (
+            sess.exec(select(models.Reading.id).limit(1)).first() is None
+            and sess.exec(select(models.StartReading.id).limit(1)).first() is None
+        ):
+            return
+    logger.info("Backfilled %d monthly rollups", rebuild_rollups())
+
+def check_rollups(meter_id: str | None = None) -> list[str]:
+    """Compare stored rollups against the raw tables and describe any drift."""
+    fields = ("start_value", "latest_value", "latest_time", "entry_count", "consumption")
+    problems = []
+    with Session(engine) as sess:
+        expected = compute_rollups(sess, meter_id)
+        stored_query = select(models.MonthlyRollup)
+        if meter_id is not None:
+            stored_query = stored_query.where(models.MonthlyRollup.meter_id == meter_id)
+        stored = {(r.meter_id, r.year, r.month): r for r in sess.exec(stored_query)}
+
+    for key in sorted(set(expected) | set(stored), key=str):
+        want, got = expected.get(key), stored.get(key)
+        if got is None:
+            problems.append(f"{key}: missing rollup")
+        elif want is None:
+            if got.entry_count or got.start_value is not None:
+                problems.append(f"{key}: rollup has no source rows")
+        else:
+            for field in fields:
+                a, b = getattr(want, field), getattr(got, field)
+                if isinstance(a, float) and isinstance(b, float) and abs(a - b) < 1e-6:
+                    continue
+                if a != b:
+                    problems.append(f"{key}: {field} is {b!r}, expected {a!r}")
+    return problems
+
+
+
+# Async variants for the FastAPI handlers. They run the sync functions above
+# on an AsyncSession via run_sync, so queries go through asyncpg without
+# blocking the event loop and the logic lives in one place.
+
+async def _run_async(fn, *args, sess: AsyncSession | None = None):
+    if not DB_ASYNC:
+        # The sync path: a worker thread, with each call on its own session
+        return await run_in_threadpool(fn, *args)
+    if sess is not None:
+        return await sess.run_sync(lambda sync_sess: fn(*args, sess=sync_sess))
+    async with AsyncSession(async_engine) as sess:
+        return await sess.run_sync(lambda sync_sess: fn(*args, sess=sync_sess))
+
+async def get_meters_async(
+    household_token: str, sess: AsyncSession | None = None
+) -> list[schemas.MeterOut]:
+    return await _run_async(get_meters, household_token, sess=sess)
+
+async def get_summary_async(
+    household_token: str, sess: AsyncSession | None = None
+) -> schemas.HomeSummary:
+    return await _run_async(get_summary, household_token, sess=sess)
+
+async def get_monthly_data_async(
+    meter_id: str, year: int, month: int, sess: AsyncSession | None = None
+) -> schemas.MonthlyData:
+    return await _run_async(get_monthly_data, meter_id, year, month, sess=sess)
+
+async def get_monthly_columns_async(
+    meter_id: str, year: int, month: int, sess: AsyncSession | None = None
+) -> dict:
+    return await _run_async(get_monthly_columns, meter_id, year, month, sess=sess)
+
+async def get_readings_page_async(
+    meter_id: str,
+    start: datetime.datetime | None = None,
+    end: datetime.datetime | None = None,
+    after: str | None = None,
+    limit: int = 500,
+    fields: list[str] | None = None,
+    sess: AsyncSession | None = None,
+) -> schemas.ReadingPage:
+    return await _run_async(get_readings_page, meter_id, start, end, after, limit, fields, sess=sess)
+
+async def get_readings_columns_async(
+    meter_id: str,
+    start: datetime.datetime | None = None,
+    end: datetime.datetime | None = None,
+    after: str | None = None,
+    limit: int = 500,
+    fields: list[str] | None = None,
+    sess: AsyncSession | None = None,
+) -> dict:
+    return await _run_async(get_readings_columns, meter_id, start, end, after, limit, fields, sess=sess)
+
+async def get_consumption_async(
+    bucket: str,
+    meter_id: str | None = None,
+    household_token: str | None = None,
+    start: datetime.date | None = None,
+    end: datetime.date | None = None,
+    sess: AsyncSession | None = None,
+) -> schemas.ConsumptionSeries:
+    return await _run_async(get_consumption, bucket, meter_id, household_token, start, end, sess=sess)
+
+async def get_insights_async(
+    household_token: str, alert_limit: int = 10, sess: AsyncSession | None = None
+) -> list[schemas.MeterInsight]:
+    return await _run_async(get_insights, household_token, alert_limit, sess=sess)
+
+async def get_export_meters_async(
+    household_token: str | None = None,
+    meter_ids: list[str] | None = None,
+    sess: AsyncSession | None = None,
+) -> list[tuple[UUID, str]]:
+    return await _run_async(get_export_meters, household_token, meter_ids, sess=sess)
+
+async def set_start_reading_async(
+    meter_id: str,
+    year: int,
+    month: int,
+    reading: float,
+    sess: AsyncSession | None = None,
+    refresh: bool = False,
+) -> schemas.RefreshedState | None:
+    return await _run_async(
+        partial(set_start_reading, refresh=refresh), meter_id, year, month, reading, sess=sess
+    )
+
+async def add_reading_async(
+    meter_id: str,
+    reading_date: datetime.date,
+    reading_val: float,
+    posted_by: str,
+    reading_time: datetime.datetime,
+    sess: AsyncSession | None = None,
+    refresh: bool = False,
+) -> int | tuple[int, schemas.RefreshedState]:
+    return await _run_async(
+        partial(add_reading, refresh=refresh),
+        meter_id,
+        reading_date,
+        reading_val,
+        posted_by,
+        reading_time,
+        sess=sess,
+    )
+
+async def add_readings_bulk_async(household_token: str, rows: list[dict]) -> schemas.BulkResult:
+    # Row validation, numpy and the first-use pandas import take seconds on
+    # a large upload, so unlike the rest this runs in a worker thread on its
+    # own sync session rather than on the event loop through run_sync
+    return await run_in_threadpool(add_readings_bulk, household_token, rows)
+
+async def has_start_reading_async(
+    meter_id: str, year: int, month: int, sess: AsyncSession | None = None
+) -> bool:
+    return await _run_async(has_start_reading, meter_id, year, month, sess=sess)
+
+async def delete_entry_async(
+    entry_id: str, sess: AsyncSession | None = None, refresh: bool = False
+) -> schemas.RefreshedState | None:
+    return await _run_async(partial(delete_entry, refresh=refresh), entry_id, sess=sess)
+
+# ETags read versions from the read cache, which may be Redis: run them in
+# a greenlet so its calls are awaited rather than blocking the loop
+
+async def household_etag_async(household_token: str) -> str:
+    return await greenlet_spawn(household_etag, household_token)
 
+async def monthly_etag_async(meter_id, year: int, month: int) -> str:
+    return await greenlet_spawn(monthly_etag, meter_id, year, month)
 
 import datetime, pytz # type: ignore
 from fastapi import FastAPI, Body # type: ignore
@@ -1,10 +1,22 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, select, make_url
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.orm import sessionmaker
-from sqlmodel import SQLModel
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from sqlalchemy.types import Uuid
+from sqlmodel import SQLModel, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from contextlib import contextmanager
+import logging
 import os
+import ssl
+import threading
+import time
+from uuid import UUID
 from dotenv import load_dotenv
 
 load_dotenv()
+logger = logging.getLogger(__name__)
 DATABASE_URL = os.getenv("DATABASE_URL")
 
 if not DATABASE_URL:
@@ -13,16 +25,261 @@ if not DATABASE_URL:
 if '?' in DATABASE_URL:
     DATABASE_URL = DATABASE_URL.split('?')[0]
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={
+class PoolWaits:
+    """Running totals of how long checkouts waited for a pooled connection."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.count += 1
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+
+
+class TimedQueuePool(QueuePool):
+    waits = PoolWaits()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.waits.record(time.perf_counter() - start)
+
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    waits = PoolWaits()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.waits.record(time.perf_counter() - start)
+
+
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+# Pool tuning, shared by the sync and async engines. Pre-ping costs a
+# SELECT 1 round-trip per checkout; with a recycle interval below the
+# server's idle timeout it can be turned off.
+POOL_SETTINGS = {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+    "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    "pool_pre_ping": _env_flag("DB_POOL_PRE_PING", "true"),
+}
+
+# Handlers reach the database through the async engine (asyncpg).
+# DB_ASYNC=false sends them down the sync path instead: the same crud
+# functions on the sync engine in the threadpool, to compare the two.
+DB_ASYNC = _env_flag("DB_ASYNC", "true")
+
+# TLS is required against the hosted database; DB_SSL=false allows a
+# local or throwaway Postgres, and SQLite URLs are accepted for benchmarks
+DB_SSL = _env_flag("DB_SSL", "true")
+_url = make_url(DATABASE_URL)
+
+if _url.get_backend_name() == "sqlite":
+    _sync_connect_args = {"check_same_thread": False}
+    _async_url = _url.set(drivername="sqlite+aiosqlite")
+    _async_connect_args = {}
+elif DB_SSL:
+    _sync_connect_args = {
         "sslmode": "require",
         "sslrootcert": "/etc/ssl/certs/ca-certificates.crt",
-    },
-    pool_pre_ping=True,
+    }
+    # Same database through asyncpg, for the async request handlers.
+    # Like libpq's sslmode=require with a root cert, verify the CA but not the hostname.
+    _ssl_context = ssl.create_default_context(cafile="/etc/ssl/certs/ca-certificates.crt")
+    _ssl_context.check_hostname = False
+    _async_url = _url.set(drivername="postgresql+asyncpg")
+    _async_connect_args = {"ssl": _ssl_context}
+else:
+    _sync_connect_args = {"sslmode": "disable"}
+    _async_url = _url.set(drivername="postgresql+asyncpg")
+    _async_connect_args = {"ssl": False}
+
+engine = create_engine(
+    DATABASE_URL,
+    connect_args=_sync_connect_args,
+    poolclass=TimedQueuePool,
+    **POOL_SETTINGS,
+)
+
+async_engine = create_async_engine(
+    _async_url,
+    connect_args=_async_connect_args,
+    poolclass=TimedAsyncQueuePool,
+    **POOL_SETTINGS,
 )
 
+class _SQLiteUuid(Uuid):
+    """Uuid that also binds the string ids crud passes, as Postgres does."""
+
+    def bind_processor(self, dialect):
+        process = super().bind_processor(dialect)
+        if process is None:
+            return None
+        return lambda value: process(UUID(value) if isinstance(value, str) else value)
+
+if _url.get_backend_name() == "sqlite":
+    for _engine in (engine, async_engine.sync_engine):
+        _engine.dialect.colspecs = {**_engine.dialect.colspecs, Uuid: _SQLiteUuid}
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+@contextmanager
+def session_scope(sess: Session | None = None):
+    """Use the caller's session if given, otherwise open one for the block."""
+    if sess is not None:
+        yield sess
+    else:
+        with Session(engine) as new_sess:
+            yield new_sess
+
+async def get_session():
+    """FastAPI dependency: one AsyncSession shared by every crud call in a request."""
+    async with AsyncSession(async_engine) as sess:
+        yield sess
+
+def pool_status(engine) -> dict:
+    """Connection pool counters for the /pool-stats endpoint."""
+    pool = engine.pool
+    status = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+        )
+    waits = getattr(pool, "waits", None)
+    if waits is not None:
+        status.update(
+            checkouts=waits.count,
+            wait_seconds_total=round(waits.total_seconds, 6),
+            wait_seconds_max=round(waits.max_seconds, 6),
+        )
+    return status
+
+# Connections each pool opens at startup, so the first requests after a
+# cold start do not pay for connecting and the TLS handshake
+WARMUP_CONNECTIONS = min(int(os.getenv("DB_WARMUP_CONNECTIONS", "0")), POOL_SETTINGS["pool_size"])
+
+def warm_up(connections: int = WARMUP_CONNECTIONS):
+    """Fill the sync pool with `connections` open connections."""
+    opened = [engine.connect() for _ in range(connections)]
+    for conn in opened:
+        conn.close()
+
+async def warm_up_async(connections: int = WARMUP_CONNECTIONS):
+    """Fill the async pool with `connections` open connections."""
+    opened = [await async_engine.connect() for _ in range(connections)]
+    for conn in opened:
+        await conn.close()
+
 def init_db():
     SQLModel.metadata.create_all(bind=engine)
+    pending = [f"{column.table.name}.{column.name}" for column in missing_columns()]
+    pending += [index.name for index in missing_indexes()]
+    if pending:
+        logger.warning(
+            "Columns or indexes missing on existing tables: %s. Run `python migrate.py` to add them.",
+            ", ".join(pending),
+        )
+
+def missing_columns() -> list:
+    """
+    Columns declared on the models but absent from tables that already
+    exist, which create_all leaves alone too. New columns are nullable, so
+    migrate_db can add them in place.
+    """
+    inspector = inspect(engine)
+    pending = []
+    for table in SQLModel.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        pending += [column for column in table.columns if column.name not in existing]
+    return pending
+
+def missing_indexes() -> list:
+    """
+    Indexes declared on the models but absent from tables that already
+    exist; create_all skips existing tables, so these need migrate_db.
+    """
+    inspector = inspect(engine)
+    pending = []
+    for table in SQLModel.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        pending += [index for index in table.indexes if index.name not in existing]
+    return pending
+
+def migrate_db() -> int:
+    """
+    Add the missing columns, then build the missing indexes. On Postgres
+    indexes are built CONCURRENTLY, so writes carry on meanwhile. Before a
+    unique index, rows duplicating its key are deleted, keeping the one
+    with the highest id, and each deletion is logged. Returns how many
+    rows were deleted.
+    """
+    deleted = 0
+    for column in missing_columns():
+        logger.info("Adding column %s.%s", column.table.name, column.name)
+        with engine.begin() as conn:
+            _add_column(conn, column)
+    for index in missing_indexes():
+        if index.unique:
+            with engine.begin() as conn:
+                deleted += _drop_duplicates(conn, index)
+        logger.info("Creating index %s", index.name)
+        if engine.dialect.name == "postgresql":
+            # CONCURRENTLY cannot run inside a transaction
+            index.dialect_kwargs["postgresql_concurrently"] = True
+            try:
+                with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                    index.create(bind=conn)
+            finally:
+                index.dialect_kwargs["postgresql_concurrently"] = False
+        else:
+            with engine.begin() as conn:
+                index.create(bind=conn)
+    return deleted
+
+def _add_column(conn, column):
+    if not column.nullable:
+        raise ValueError(f"Cannot add NOT NULL column {column.table.name}.{column.name} in place")
+    references = "".join(
+        f" REFERENCES {fk.column.table.name} ({fk.column.name})" for fk in column.foreign_keys
+    )
+    definition = CreateColumn(column).compile(dialect=engine.dialect)
+    conn.exec_driver_sql(f"ALTER TABLE {column.table.name} ADD COLUMN {definition}{references}")
+
+def _drop_duplicates(conn, index) -> int:
+    """
+    Keep the highest-id row per key of a unique index about to be created.
+    Returns how many rows were deleted.
+    """
+    table = index.table
+    seen = set()
+    deleted = 0
+    rows = conn.execute(select(table.c.id, *index.columns).order_by(*index.columns, table.c.id.desc()))
+    for row in rows.all():
+        key = tuple(row[1:])
+        if key in seen:
+            logger.warning("Deleting %s row %s, a duplicate of %s on %s", table.name, row.id, key, index.name)
+            conn.execute(table.delete().where(table.c.id == row.id))
+            deleted += 1
+        else:
+            seen.add(key)
+    return deleted
@@ -0,0 +1,102 @@
+# export_archive.py
+import asyncio
+import io
+import logging
+import os
+import re
+import time
+import zipfile
+from collections import deque
+
+import crud
+from export_cache import export_cache, export_key_async
+from export_pool import archive_pool
+
+logger = logging.getLogger(__name__)
+
+# Most workbooks (meters x years) one archive may hold
+MAX_WORKBOOKS = int(os.getenv("ARCHIVE_MAX_WORKBOOKS", "240"))
+
+
+class ZipSink(io.RawIOBase):
+    """
+    Unseekable file for ZipFile to write into. The bytes written so far are
+    taken out with drain(), so only the entry being added is ever held.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def entry_names(meters) -> dict:
+    """File-safe name per meter id, suffixed with the id where names clash."""
+    safe = {meter_id: re.sub(r"[^\w.-]+", "_", name).strip("_") or "meter" for meter_id, name in meters}
+    counts = {}
+    for name in safe.values():
+        counts[name] = counts.get(name, 0) + 1
+    return {
+        meter_id: name if counts[name] == 1 else f"{name}_{str(meter_id)[:8]}"
+        for meter_id, name in safe.items()
+    }
+
+
+async def render(meter_id, name: str, year: int) -> bytes:
+    """One meter's yearly workbook, from the export cache or a pool worker."""
+    key = await export_key_async(meter_id, year, name)
+    cached = export_cache.get(key)
+    if cached is not None:
+        return cached
+    data = await archive_pool.run(crud.render_export, str(meter_id), year, wait=True)
+    export_cache.put(key, data)
+    return data
+
+
+async def stream_archive(meters, years):
+    """
+    Yield a zip with one workbook per meter and year, in order. Renders run
+    up to the pool's worker count ahead of the entry being written, so
+    about that many workbooks are in memory at once, never the archive.
+    """
+    names = entry_names(meters)
+    jobs = iter([(meter_id, name, year) for meter_id, name in meters for year in years])
+    pending = deque()
+
+    def schedule():
+        while len(pending) < archive_pool.max_workers:
+            job = next(jobs, None)
+            if job is None:
+                return
+            meter_id, name, year = job
+            path = f"{names[meter_id]}_{year}_readings.xlsx"
+            pending.append((path, asyncio.ensure_future(render(meter_id, name, year))))
+
+    sink = ZipSink()
+    try:
+        # Workbooks are zips already, so entries are stored, not recompressed
+        with zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED) as archive:
+            schedule()
+            while pending:
+                path, task = pending.popleft()
+                data = await task
+                schedule()
+                archive.writestr(zipfile.ZipInfo(path, time.localtime()[:6]), data)
+                yield sink.drain()
+        yield sink.drain()
+    except Exception:
+        logger.exception("Export archive failed")
+        raise
+    finally:
+        for _, task in pending:
+            task.cancel()
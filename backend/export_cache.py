@@ -0,0 +1,159 @@
+# export_cache.py
+import hashlib
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy.util import greenlet_spawn
+
+from read_cache import read_cache
+
+# Cached exports also turn over this often, so writes made outside the
+# API (rollups.py, scripts) are picked up without a version bump
+EXPORT_CACHE_TTL = float(os.getenv("EXPORT_CACHE_TTL", "300"))
+
+
+class DataVersions:
+    """
+    Per meter/year write counters. crud bumps them on every write so that
+    anything derived from a year's readings can tell when it went stale.
+    They live in the read cache's backend, so with READ_CACHE_URL set every
+    worker shares them (Redis INCR).
+    """
+
+    def __init__(self, cache, prefix: str = "exportversion"):
+        self.cache = cache
+        self.prefix = prefix
+
+    def _key(self, meter_id, year: int) -> str:
+        return f"{self.cache.prefix}:{self.prefix}:{meter_id}:{year}"
+
+    def bump(self, meter_id, year: int):
+        self.cache.backend.incr(self._key(meter_id, year))
+
+    def year_stamp(self, meter_id, year: int) -> int:
+        return self.cache.backend.get_counter(self._key(meter_id, year))
+
+
+class ExportCache:
+    """
+    LRU cache of rendered export files, bounded by total bytes.
+    With `disk_dir` set, entries evicted from memory are kept on disk and
+    promoted back on their next hit. The directory is owned by the cache and
+    cleared on start, since data versions do not survive a restart.
+    """
+
+    def __init__(self, max_bytes: int, disk_dir: str | None = None, disk_max_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_bytes // 4
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk = OrderedDict()
+        self._disk_bytes = 0
+        if disk_dir:
+            shutil.rmtree(disk_dir, ignore_errors=True)
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def get(self, key) -> bytes | None:
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return data
+            data = self._read_disk(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._store(key, data)
+            return data
+
+    def put(self, key, data: bytes):
+        if len(data) > self.max_item_bytes:
+            return
+        with self._lock:
+            self._store(key, data)
+
+    def put_file(self, key, file):
+        """Cache a rendered file if it fits, leaving it rewound for the caller"""
+        size = file.seek(0, os.SEEK_END)
+        file.seek(0)
+        if size <= self.max_item_bytes:
+            self.put(key, file.read())
+            file.seek(0)
+
+    def _store(self, key, data: bytes):
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.max_bytes:
+            evicted_key, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self._write_disk(evicted_key, evicted)
+
+    def _disk_path(self, key) -> str:
+        name = hashlib.sha256(repr(key).encode()).hexdigest()
+        return os.path.join(self.disk_dir, f"{name}.xlsx")
+
+    def _read_disk(self, key) -> bytes | None:
+        if key not in self._disk:
+            return None
+        self._disk_bytes -= self._disk.pop(key)
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+        finally:
+            self._remove(path)
+
+    def _write_disk(self, key, data: bytes):
+        if not self.disk_dir or len(data) > self.disk_max_bytes:
+            return
+        with open(self._disk_path(key), "wb") as f:
+            f.write(data)
+        self._disk[key] = len(data)
+        self._disk_bytes += len(data)
+        while self._disk_bytes > self.disk_max_bytes:
+            evicted_key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            self._remove(self._disk_path(evicted_key))
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+data_versions = DataVersions(read_cache)
+
+export_cache = ExportCache(
+    max_bytes=int(os.getenv("EXPORT_CACHE_BYTES", str(64 * 1024 * 1024))),
+    disk_dir=os.getenv("EXPORT_CACHE_DIR") or None,
+    disk_max_bytes=int(os.getenv("EXPORT_CACHE_DISK_BYTES", str(512 * 1024 * 1024))),
+)
+
+
+def export_key(meter_id, year: int, meter_name: str) -> tuple:
+    """Cache key for a yearly export at the meter's current data version"""
+    bucket = int(time.time() // EXPORT_CACHE_TTL) if EXPORT_CACHE_TTL else 0
+    meter_id = str(meter_id)
+    return (meter_id, year, meter_name, data_versions.year_stamp(meter_id, year), bucket)
+
+
+async def export_key_async(meter_id, year: int, meter_name: str) -> tuple:
+    """export_key from async code, awaiting the backend if it is Redis"""
+    return await greenlet_spawn(export_key, meter_id, year, meter_name)
@@ -0,0 +1,85 @@
+# export_pool.py
+import asyncio
+import contextvars
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+
+class PoolSaturated(Exception):
+    """Raised when an ExportPool already has its limit of jobs in flight."""
+
+
+class ExportPool:
+    """
+    Thread pool for blocking export work called from async endpoints.
+    At most `max_workers` jobs run at once and `max_queue` more may wait;
+    anything beyond that is rejected instead of piling up.
+
+    With `processes` set the jobs run in spawned worker processes instead,
+    so CPU-bound rendering is not serialised on the GIL. Their functions
+    and results must then be picklable.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, processes: bool = False):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self._released = None
+        self.processes = processes
+        if processes:
+            # Spawn rather than fork, so workers do not inherit the parent's
+            # pooled DB connections or event loop
+            self._executor = ProcessPoolExecutor(
+                max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        else:
+            self._executor = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="export"
+            )
+
+    def saturated(self) -> bool:
+        return self.in_flight >= self.max_workers + self.max_queue
+
+    async def run(self, fn, *args, wait: bool = False):
+        """
+        Run `fn(*args)` on the pool. When it is saturated, raise
+        PoolSaturated, or with `wait` set, wait for a slot to free up.
+        """
+        # Only touched from the event loop thread, so no lock is needed
+        while self.saturated():
+            if not wait:
+                raise PoolSaturated()
+            if self._released is None:
+                self._released = asyncio.Event()
+            await self._released.wait()
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            if not self.processes:
+                # Carry the caller's context over, as asyncio.to_thread does,
+                # so per-request tracking sees the job's queries
+                fn = partial(contextvars.copy_context().run, fn)
+            return await loop.run_in_executor(self._executor, fn, *args)
+        finally:
+            self.in_flight -= 1
+            if self._released is not None:
+                self._released.set()
+                self._released = None
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+export_pool = ExportPool(
+    max_workers=int(os.getenv("EXPORT_MAX_WORKERS", "2")),
+    max_queue=int(os.getenv("EXPORT_MAX_QUEUE", "4")),
+)
+
+# Renders for multi-workbook archives, in their own processes
+archive_pool = ExportPool(
+    max_workers=int(os.getenv("ARCHIVE_MAX_WORKERS", "2")),
+    max_queue=int(os.getenv("ARCHIVE_MAX_QUEUE", "8")),
+    processes=True,
+)
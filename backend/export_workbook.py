@@ -0,0 +1,309 @@
+# export_workbook.py
+"""
+Yearly Excel export: the workbook styles, the data it is built from and
+the writer. Imported by crud on the first export, since openpyxl and
+pandas are the heaviest imports in the app and most processes never
+render a workbook.
+"""
+import calendar
+import datetime
+import logging
+from copy import copy
+from tempfile import SpooledTemporaryFile
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
+from openpyxl.styles.fonts import DEFAULT_FONT
+from sqlmodel import Session
+
+import analytics
+import models
+from database import engine
+
+logger = logging.getLogger(__name__)
+
+# Define fill colors for thresholds (light to dark red)
+fills = {
+    170: PatternFill(start_color="FFCCCC", end_color="FFCCCC", fill_type="solid"),  # light red
+    180: PatternFill(start_color="FF6666", end_color="FF6666", fill_type="solid"),  # medium red
+    190: PatternFill(start_color="CC0000", end_color="CC0000", fill_type="solid"),  # dark red
+    200: PatternFill(start_color="800000", end_color="800000", fill_type="solid"),  # very dark red
+}
+
+# Font color per threshold (light bg => black text, dark bg => white text)
+threshold_fonts = {
+    170: Font(color="000000"),
+    180: Font(color="000000"),
+    190: Font(color="FFFFFF"),
+    200: Font(color="FFFFFF"),
+}
+
+# Styling to match your app theme (Deep Teal #004D40, Soft Lilac #D8BFD8).
+# Built once and registered as named styles on each export workbook, so
+# cells only reference a style by name instead of carrying style objects.
+_thin = Side(style='thin')
+_border = Border(left=_thin, right=_thin, top=_thin, bottom=_thin)
+_center = Alignment(horizontal='center')
+_bold = Font(bold=True)
+
+EXPORT_STYLES = [
+    NamedStyle("export_title", font=Font(size=16, bold=True, color="004D40"), alignment=_center),
+    NamedStyle("export_subtitle", font=Font(size=12, bold=True, color="666666"), alignment=_center),
+    NamedStyle("export_info", font=Font(size=10, bold=True, color="666666")),
+    NamedStyle("export_note", font=Font(size=12, italic=True, color="999999")),
+    NamedStyle(
+        "export_header",
+        font=Font(color="FFFFFF", bold=True),
+        fill=PatternFill(start_color="004D40", end_color="004D40", fill_type="solid"),
+        alignment=_center,
+        border=_border,
+    ),
+    NamedStyle("export_cell", font=DEFAULT_FONT, border=_border),
+    # Alternating row color for better readability
+    NamedStyle(
+        "export_cell_band",
+        font=DEFAULT_FONT,
+        fill=PatternFill(start_color="F8F9FA", end_color="F8F9FA", fill_type="solid"),
+        border=_border,
+    ),
+    NamedStyle("export_total", font=_bold),
+    NamedStyle(
+        "export_total_label",
+        font=_bold,
+        fill=PatternFill(start_color="D8BFD8", end_color="D8BFD8", fill_type="solid"),
+    ),
+]
+for _threshold, _fill in fills.items():
+    EXPORT_STYLES += [
+        NamedStyle(f"export_cell_{_threshold}", font=threshold_fonts[_threshold], fill=_fill, border=_border),
+        NamedStyle(f"export_legend_{_threshold}", font=threshold_fonts[_threshold], fill=_fill),
+    ]
+
+# Table cell style for a consumption value, colored by threshold
+threshold_cell_styles = {None: "export_cell"}
+threshold_cell_styles.update({t: f"export_cell_{t}" for t in fills})
+
+def get_yearly_data_for_export(meter_id: str, year: int):
+    """
+    Get all 12 months of data for Excel export.
+    The year's readings are loaded once into a frame; per-reading units and
+    bands and the monthly totals are computed on whole columns.
+    """
+    with Session(engine) as sess:
+        frame = analytics.load_readings(
+            sess, meter_id, datetime.date(year, 1, 1), datetime.date(year + 1, 1, 1)
+        )
+        starts = analytics.load_starts(sess, meter_id, year)
+    frame = analytics.add_month_columns(frame, starts)
+    months = analytics.month_rollup(frame, starts, year)
+    by_month = dict(tuple(frame.groupby("month")))
+    empty = frame.iloc[0:0]
+
+    yearly_data = []
+    for month, row in months.iterrows():
+        yearly_data.append({
+            'month': month,
+            'month_name': calendar.month_name[month],
+            'year': year,
+            'start_reading': float(row['start']),
+            'entries': by_month.get(month, empty),
+            'total_consumption': max(0.0, float(row['consumption'])),
+            'average_daily': float(row['average_daily']),
+            'total_readings': int(row['entries']),
+            'days_in_month': int(row['days']),
+        })
+
+    return yearly_data
+
+class ExcelExportService:
+    # Workbooks larger than this spill from memory to a temp file on disk
+    spool_size = 1024 * 1024
+
+    def create_yearly_excel(self, meter, yearly_data):
+        """
+        Create Excel file with summary + 12 monthly sheets.
+
+        Uses a write-only workbook, so rows are serialized as they are
+        appended, and returns a spooled temp file positioned at the start.
+        """
+        wb = Workbook(write_only=True)
+        for style in EXPORT_STYLES:
+            wb.add_named_style(copy(style))
+        
+        # Create summary sheet first
+        self._create_summary_sheet(wb, meter, yearly_data)
+       
+        # Create monthly sheets
+        for month_data in yearly_data:
+            self._create_monthly_sheet(wb, meter, month_data)
+        
+        excel_file = SpooledTemporaryFile(max_size=self.spool_size)
+        wb.save(excel_file)
+        excel_file.seek(0)
+        logger.debug("Rendered export for meter %s", meter.id)
+        return excel_file
+
+    def _cell(self, ws, value, style):
+        """Build a cell for a write-only sheet using a registered named style"""
+        cell = WriteOnlyCell(ws, value=value)
+        cell.style = style
+        return cell
+
+    def _header_row(self, ws, headers):
+        return [self._cell(ws, header, "export_header") for header in headers]
+    
+    def _create_summary_sheet(self, wb, meter, yearly_data):
+        """Create annual summary sheet"""
+        ws = wb.create_sheet("Annual Summary", 0)
+        year = yearly_data[0]['year'] if yearly_data else datetime.datetime.now().year
+
+        # Column widths must be set before any row is written
+        for col in ['B', 'C', 'D', 'E']:
+            ws.column_dimensions[col].width = 20
+        ws.column_dimensions['A'].width = 30
+
+        # Header
+        ws.append([self._cell(ws, f"Annual Energy Report - {meter.name}", "export_title")])
+        ws.merged_cells.add('A1:F1')
+        ws.append([])
+
+        # Meter info
+        meter_name = meter.name
+        if meter_name == "First Floor Meter":
+            meter_name = "FIRST FLOOR (SAY39286)"
+        ws.append([meter_name])
+        ws.append([f"Report Year: {year}"])
+        ws.append([f"Generated: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"])
+        ws.append([])
+        ws.append([])
+
+        # Monthly summary table headers (row 8)
+        headers = ["Month", "Start Reading", "Total Entries", "Monthly Consumption", "Avg Daily"]
+        ws.append(self._header_row(ws, headers))
+
+        total_consumption = 0
+        total_entries = 0
+        latest_start_reading = 0
+
+        # Fill monthly data rows (rows 9-20)
+        for month_data in yearly_data:
+            entry_count = month_data.get('total_readings', 0)
+            start_reading = month_data.get('start_reading', 0)
+            consumption = month_data.get('total_consumption', 0)
+
+            # Track latest non-zero start reading
+            if start_reading != 0:
+                latest_start_reading = start_reading
+
+            total_consumption += consumption
+            total_entries += entry_count
+
+            ws.append([
+                self._cell(ws, month_data['month_name'], "export_cell"),
+                self._cell(ws, round(start_reading, 2), "export_cell"),
+                self._cell(ws, entry_count, "export_cell"),
+                # Apply color coding for monthly consumption
+                self._cell(ws, round(consumption, 2), threshold_cell_styles[models.threshold_band(consumption) or None]),
+                self._cell(ws, round(month_data.get('average_daily', 0), 2), "export_cell"),
+            ])
+
+        for _ in range(len(yearly_data), 12):
+            ws.append([])
+
+        # Total row (row 21)
+        ws.append([
+            self._cell(ws, "TOTAL", "export_total_label"),
+            self._cell(ws, round(latest_start_reading, 2), "export_total"),
+            self._cell(ws, total_entries, "export_total"),
+            self._cell(ws, round(total_consumption, 0), "export_total"),
+        ])
+
+        # Add legend/explanation for color coding starting at row 24
+        ws.append([])
+        ws.append([])
+        legend = [
+            ("≥ 200: Extreme consumption", 200),
+            ("≥ 190: Very high consumption", 190),
+            ("≥ 180: High consumption ", 180),
+            ("≥ 170: Elevated consumption ", 170),
+        ]
+        for label, threshold in legend:
+            ws.append([self._cell(ws, label, f"export_legend_{threshold}")])
+        
+
+    def _create_monthly_sheet(self, wb, meter, month_data):
+        """Create individual monthly sheet with prettier formatting"""
+        sheet_name = f"{month_data['month_name']} {month_data['year']}"
+        try:
+            ws = wb.create_sheet(sheet_name)
+            
+            entries = month_data['entries']
+            start_reading = month_data.get('start_reading', 0)
+            
+            logger.debug("Creating sheet %s: %d entries, start_reading %s",
+                         sheet_name, len(entries), start_reading)
+
+            if len(entries):
+                # Column widths - adjusted for prettier appearance
+                ws.column_dimensions['A'].width = 30  # Timestamp column wider
+                ws.column_dimensions['B'].width = 15  # Reading value
+                ws.column_dimensions['C'].width = 18  # Change from previous
+            
+            # Row 1: Main Header - METER READING SHEET {MONTH} {YEAR}
+            ws.append([self._cell(
+                ws, f"METER READING BALANCE {month_data['month_name'].upper()} {month_data['year']}",
+                "export_title",
+            )])
+            ws.merged_cells.add('A1:D1')
+            
+            # Row 2: Floor and Meter Information using helper function
+            if meter.name=="Second Floor Meter":
+                floor_info="SECOND FLOOR (SCY74980)"
+            else:
+                floor_info = "FIRST FLOOR (SAY39286)"
+            #floor_info = "First Floor Meter (SAY39286)" if meter.id!="fa76ead1-61a8-495d-8339-3abea2bf2740" else "Second Floor Meter (SCY74980)"
+            ws.append([self._cell(ws, floor_info, "export_subtitle")])
+            ws.merged_cells.add('A2:D2')
+            ws.append([])
+            
+            # Add some spacing and summary info below row 2
+            ws.append([
+                self._cell(ws, f"Start Reading: {start_reading:.0f} units", "export_info"),
+                self._cell(ws, f"Total Entries: {len(entries)}", "export_info"),
+                self._cell(ws, f"Total Consumption: {month_data.get('total_consumption', 0):.0f} units",
+                           "export_info"),
+            ])
+            ws.append([])
+            
+            if not len(entries):
+                ws.append([self._cell(ws, "No readings available for this month", "export_note")])
+                return
+            
+            # Row 6: Table headers - starting from row 6 to give more space
+            headers = ["Posted Timestamp", "Reading Value", "Units"]
+            ws.append(self._header_row(ws, headers))
+            
+            # Entries come ordered by time; format and round whole columns
+            # up front so the row loop only builds cells
+            timestamps = analytics.format_times(entries["time"])
+            readings = entries["reading"].round(0).tolist()
+            units = entries["units"].round(0).tolist()
+            unit_styles = [threshold_cell_styles[band or None] for band in entries["band"].tolist()]
+            
+            # Data rows start from row 7
+            for idx, row in enumerate(zip(timestamps, readings, units, unit_styles), 7):
+                timestamp_str, reading, change_from_prev, unit_style = row
+
+                # Add alternating row colors for better readability
+                row_style = "export_cell_band" if idx % 2 == 0 else "export_cell"
+
+                ws.append([
+                    self._cell(ws, timestamp_str, row_style),
+                    self._cell(ws, reading, row_style),
+                    self._cell(ws, change_from_prev, unit_style),
+                ])
+            
+        except Exception:
+            logger.exception("Sheet creation failed for %s", sheet_name)
+            raise
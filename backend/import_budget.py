@@ -0,0 +1,67 @@
+# import_budget.py
+"""
+Check the API's cold-start import cost:
+
+    python import_budget.py --budget-ms 1000
+
+Imports main in fresh interpreters under `python -X importtime`. Fails when
+the fastest run goes over the budget, or when startup pulls in any of the
+export stack (pandas, numpy, openpyxl), which is meant to load on first use.
+No database is contacted; without DATABASE_URL a placeholder Postgres URL
+is used so the same drivers load as in production. The same checks run in
+the test suite (tests/test_import_budget.py); the timing one only when
+IMPORT_BUDGET_MS is set, since it depends on how busy the machine is.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+LAZY_MODULES = ("pandas", "numpy", "openpyxl")
+BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "1000"))
+
+
+def import_times(module: str) -> dict[str, int]:
+    """Cumulative import time in microseconds per module, from one fresh run."""
+    env = {"DATABASE_URL": "postgresql://budget@localhost/budget", **os.environ}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Check the API's cold-start import cost.")
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=3, help="fresh imports; the fastest counts")
+    parser.add_argument("--module", default="main")
+    args = parser.parse_args(argv)
+
+    runs = [import_times(args.module) for _ in range(args.runs)]
+    best = min(run[args.module] for run in runs) / 1000
+    problems = []
+    if best > args.budget_ms:
+        problems.append(f"import {args.module} took {best:.0f} ms, budget {args.budget_ms:.0f} ms")
+    eager = [name for name in LAZY_MODULES if name in runs[0]]
+    if eager:
+        problems.append(f"imported at startup: {', '.join(eager)}")
+
+    print(f"import {args.module}: {best:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    for problem in problems:
+        print("FAIL", problem)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,16 @@
+# logging_config.py
+import logging
+import os
+
+LOG_FORMAT = "%(asctime)s level=%(levelname)s logger=%(name)s %(message)s"
+
+
+def configure_logging():
+    """
+    Configure root logging from the LOG_LEVEL env var (default INFO),
+    so debug output from the export and entry paths stays off unless asked for.
+    """
+    logging.basicConfig(
+        level=os.getenv("LOG_LEVEL", "INFO").upper(),
+        format=LOG_FORMAT,
+    )
@@ -1,14 +1,35 @@
 
-from fastapi import FastAPI, Depends, Body, Query, Path
+from fastapi import FastAPI, Depends, Body, Query, Path, Request, Response
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-import crud, schemas
-from database import init_db, SessionLocal
+from starlette.concurrency import run_in_threadpool
+from compression import CompressionMiddleware
+import crud, schemas, metrics
+from database import init_db, get_session, pool_status, engine, async_engine, warm_up, warm_up_async
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import text
+from export_pool import export_pool, archive_pool, PoolSaturated
+from export_archive import stream_archive, MAX_WORKBOOKS
+from export_cache import export_cache, export_key_async
+from read_cache import read_cache
 from sqlmodel import Session
-from typing import List
+from typing import List, Optional
 import datetime
+import csv
+import io
+import importlib
+import json
+import logging
+import os
+import threading
+import time
+from logging_config import configure_logging
 
 from pydantic import BaseModel
 
+configure_logging()
+logger = logging.getLogger(__name__)
+
 class StartReadingIn(BaseModel):
     year: int
     month: int
@@ -20,36 +41,186 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
+app.add_middleware(CompressionMiddleware)
+
+@app.middleware("http")
+async def record_timing(request: Request, call_next):
+    """
+    Per-route latency and SQL statement counts, into /metrics and a
+    Server-Timing header. Streamed bodies are timed to their first byte.
+    """
+    start = time.perf_counter()
+    with metrics.track_statements() as stats:
+        response = await call_next(request)
+    seconds = time.perf_counter() - start
+    route = request.scope.get("route")
+    metrics.observe_request(
+        request.method, route.path if route else "unmatched", response.status_code, seconds, stats
+    )
+    response.headers["Server-Timing"] = metrics.server_timing(seconds, stats)
+    response.headers["Timing-Allow-Origin"] = "*"
+    return response
 
 @app.on_event("startup")
-def on_startup():
+async def on_startup():
     init_db()
+    crud.ensure_rollups()
+    warm_up()
+    await warm_up_async()
+    if os.getenv("EXPORT_PRELOAD", "false").lower() in ("1", "true", "yes"):
+        # Load the export stack off the startup path, so startup stays fast
+        # and the first export does not pay for it either
+        threading.Thread(
+            target=importlib.import_module, args=("export_workbook",), daemon=True
+        ).start()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    export_pool.shutdown()
+    archive_pool.shutdown()
+
+def not_modified(request: Request, response: Response, etag: str) -> Response | None:
+    """
+    Attach validators to `response` and return a 304 when the client's
+    If-None-Match already names the current version, so the handler can
+    skip its queries and serialization.
+    """
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    response.headers.update(headers)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+        if etag in tags or "*" in tags:
+            return Response(status_code=304, headers=headers)
+    return None
+
+# format=columnar sends entries as parallel arrays of epoch days/seconds and
+# values instead of one object each; msgpack is the same in MessagePack
+compact_formats = "^(json|columnar|msgpack)$"
+
+def compact_response(payload: dict, fmt: str, response: Response | None = None) -> Response:
+    """Encode a columnar payload, keeping any validators set on `response`."""
+    headers = {}
+    if response is not None:
+        headers = {k: response.headers[k] for k in ("etag", "cache-control") if k in response.headers}
+    if fmt == "msgpack":
+        try:
+            import msgpack
+        except ImportError:
+            raise HTTPException(status_code=406, detail="MessagePack is not available on this server")
+        return Response(msgpack.packb(payload), media_type="application/msgpack", headers=headers)
+    body = json.dumps(payload, separators=(",", ":"))
+    return Response(body, media_type="application/json", headers=headers)
 
 @app.get("/home/{home_id}/meters", response_model=List[schemas.MeterOut])
-def read_meters(home_id: str):
-    return crud.get_meters(home_id)
+async def read_meters(
+    home_id: str, request: Request, response: Response, db: AsyncSession = Depends(get_session)
+):
+    cached = not_modified(request, response, await crud.household_etag_async(home_id))
+    if cached:
+        return cached
+    return await crud.get_meters_async(home_id, sess=db)
 
 @app.get("/home/{home_id}/summary", response_model=schemas.HomeSummary)  # NEW
 
-def read_summary(home_id: str):
-    return crud.get_summary(home_id)
+async def read_summary(
+    home_id: str, request: Request, response: Response, db: AsyncSession = Depends(get_session)
+):
+    cached = not_modified(request, response, await crud.household_etag_async(home_id))
+    if cached:
+        return cached
+    return await crud.get_summary_async(home_id, sess=db)
 
 @app.get("/home/{home_id}/meters/{meter_id}/data", response_model=schemas.MonthlyData)
-def read_monthly(meter_id: str, year: int, month: int):
-    return crud.get_monthly_data(meter_id, year, month)
+async def read_monthly(
+    meter_id: str,
+    year: int,
+    month: int,
+    request: Request,
+    response: Response,
+    fmt: str = Query("json", alias="format", pattern=compact_formats),
+    db: AsyncSession = Depends(get_session),
+):
+    cached = not_modified(request, response, await crud.monthly_etag_async(meter_id, year, month))
+    if cached:
+        return cached
+    if fmt != "json":
+        columns = await crud.get_monthly_columns_async(meter_id, year, month, sess=db)
+        return compact_response(columns, fmt, response)
+    return await crud.get_monthly_data_async(meter_id, year, month, sess=db)
+
+@app.get("/home/{home_id}/meters/{meter_id}/readings", response_model=schemas.ReadingPage)
+async def read_readings(
+    meter_id: str,
+    start: Optional[datetime.datetime] = Query(None, alias="from"),
+    end: Optional[datetime.datetime] = Query(None, alias="to"),
+    after: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(500, ge=1, le=5000),
+    fields: Optional[str] = Query(None, description="comma separated, e.g. time,reading"),
+    fmt: str = Query("json", alias="format", pattern=compact_formats),
+    db: AsyncSession = Depends(get_session),
+):
+    """Readings with from <= time < to, oldest first, one page at a time."""
+    field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    if fmt != "json":
+        columns = await crud.get_readings_columns_async(
+            meter_id, start, end, after, limit, field_list, sess=db
+        )
+        return compact_response(columns, fmt)
+    return await crud.get_readings_page_async(
+        meter_id, start, end, after, limit, field_list, sess=db
+    )
+
+@app.get("/home/{home_id}/consumption", response_model=schemas.ConsumptionSeries)
+async def read_home_consumption(
+    home_id: str,
+    bucket: str = Query("month", description="day, week, month or year"),
+    start: Optional[datetime.date] = Query(None, alias="from"),
+    end: Optional[datetime.date] = Query(None, alias="to"),
+    db: AsyncSession = Depends(get_session),
+):
+    return await crud.get_consumption_async(
+        bucket, household_token=home_id, start=start, end=end, sess=db
+    )
+
+@app.get("/home/{home_id}/meters/{meter_id}/consumption", response_model=schemas.ConsumptionSeries)
+async def read_meter_consumption(
+    meter_id: str,
+    bucket: str = Query("month", description="day, week, month or year"),
+    start: Optional[datetime.date] = Query(None, alias="from"),
+    end: Optional[datetime.date] = Query(None, alias="to"),
+    db: AsyncSession = Depends(get_session),
+):
+    return await crud.get_consumption_async(bucket, meter_id=meter_id, start=start, end=end, sess=db)
+
+@app.get("/home/{home_id}/insights", response_model=List[schemas.MeterInsight])
+async def read_insights(
+    home_id: str,
+    alerts: int = Query(10, ge=0, le=100, description="latest alerts per meter"),
+    db: AsyncSession = Depends(get_session),
+):
+    """Daily rate, month-end projection and recent alerts for each meter."""
+    return await crud.get_insights_async(home_id, alerts, sess=db)
 
 @app.post("/home/{home_id}/meters/{meter_id}/startReading")
-def post_start(
+async def post_start(
     meter_id: str,
     payload: StartReadingIn,          # <-- read from JSON body
+    include_state: bool = Query(False),
+    db: AsyncSession = Depends(get_session),
 ):
-    crud.set_start_reading(
+    state = await crud.set_start_reading_async(
         meter_id,
         payload.year,
         payload.month,
-        payload.reading
+        payload.reading,
+        sess=db,
+        refresh=include_state,
     )
+    if include_state:
+        return {"status": "ok", "monthly": state.monthly, "summary": state.summary}
     return {"status": "ok"}
 
 from typing_extensions import Optional
@@ -68,12 +239,14 @@ from fastapi import Body, HTTPException
 # from your code it looked like you have pk_tz variable already
 
 @app.post("/home/{home_id}/meters/{meter_id}/entries")
-def post_entry(
+async def post_entry(
     meter_id: str,
     date: datetime.date = Body(..., embed=True),
     reading: float = Body(..., embed=True),
     name: str = Body(..., embed=True),
-    posting_date: Optional[datetime.date] = Body(None, embed=True)
+    posting_date: Optional[datetime.date] = Body(None, embed=True),
+    include_state: bool = Query(False),
+    db: AsyncSession = Depends(get_session),
 ):  
     import datetime
     # Current time in Pakistan
@@ -82,43 +255,109 @@ def post_entry(
     posting_date if posting_date else now_in_pk.date(),
     now_in_pk.time()
     )
-    print(reading_time)
-    level = crud.add_reading(meter_id, date, reading, name, reading_time)
+    logger.debug("Posting reading for meter %s at %s", meter_id, reading_time)
+    if include_state:
+        level, state = await crud.add_reading_async(
+            meter_id, date, reading, name, reading_time, sess=db, refresh=True
+        )
+        return {"status": "ok", "level": level, "monthly": state.monthly, "summary": state.summary}
+    level = await crud.add_reading_async(meter_id, date, reading, name, reading_time, sess=db)
     return {"status": "ok", "level": level}
 
 
 
+def bulk_rows(body: bytes, content_type: str) -> list:
+    """The rows of a bulk upload, from a JSON array or CSV body."""
+    if content_type.startswith("text/csv"):
+        try:
+            rows = list(csv.DictReader(io.StringIO(body.decode("utf-8-sig"))))
+        except (UnicodeDecodeError, csv.Error) as e:
+            raise HTTPException(status_code=400, detail=f"Invalid CSV: {e}")
+        # Blank optional cells mean "not given"
+        rows = [{k: v for k, v in row.items() if v not in ("", None)} for row in rows]
+    else:
+        try:
+            rows = json.loads(body)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON: {e}")
+        if not isinstance(rows, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array of readings")
+    return rows
+
+@app.post("/home/{home_id}/readings/bulk", response_model=schemas.BulkResult)
+async def post_readings_bulk(home_id: str, request: Request):
+    """
+    Import many readings at once, as a JSON array or a CSV upload
+    (Content-Type: text/csv) with columns meter_id,date,reading,name[,time].
+    Valid rows are inserted; rejected rows are reported by index.
+    """
+    body = await request.body()
+    # Parsing a large upload is CPU work too: keep it off the event loop
+    rows = await run_in_threadpool(bulk_rows, body, request.headers.get("content-type", ""))
+    return await crud.add_readings_bulk_async(home_id, rows)
+
 @app.get("/ping-db")
-def ping_db(name: str = Depends(lambda: None), db: Session = Depends(lambda: SessionLocal())):
+async def ping_db(db: AsyncSession = Depends(get_session)):
     try:
-        db.execute("SELECT 1")
+        await db.exec(text("SELECT 1"))
         return {"status": "connected"}
     except Exception as e:
         return {"status": "error", "detail": str(e)}
+
+@app.get("/pool-stats")
+def pool_stats():
+    return {"sync": pool_status(engine), "async": pool_status(async_engine.sync_engine)}
+
+@app.get("/cache-stats")
+def cache_stats():
+    return {
+        "read": {"hits": read_cache.hits, "misses": read_cache.misses},
+        "export": {"hits": export_cache.hits, "misses": export_cache.misses},
+    }
     
+@app.get("/metrics", response_class=PlainTextResponse)
+def read_metrics():
+    gauges = {
+        "export_pool_in_flight": export_pool.in_flight,
+        "archive_pool_in_flight": archive_pool.in_flight,
+    }
+    counters = {
+        "read_cache_hits_total": read_cache.hits,
+        "read_cache_misses_total": read_cache.misses,
+        "export_cache_hits_total": export_cache.hits,
+        "export_cache_misses_total": export_cache.misses,
+    }
+    return PlainTextResponse(
+        metrics.render(gauges, counters), media_type="text/plain; version=0.0.4"
+    )
+
 @app.get("/home/{home_id}/meters/{meter_id}/hasStart")
-def has_start(
+async def has_start(
     meter_id: str = Path(...),
     year: int = Query(..., ge=2000),
-    month: int = Query(..., ge=1, le=12)
+    month: int = Query(..., ge=1, le=12),
+    db: AsyncSession = Depends(get_session),
 ):
-    ok = crud.has_start_reading(meter_id, year, month)
+    ok = await crud.has_start_reading_async(meter_id, year, month, sess=db)
     return {"has_start": ok}
 
 
 @app.delete("/home/{home_id}/meters/{meter_id}/entries/{entry_id}")
-def delete_entry(
+async def delete_entry(
     meter_id: str,
-    entry_id: str = Path(..., description="ID of the entry to delete")
+    entry_id: str = Path(..., description="ID of the entry to delete"),
+    include_state: bool = Query(False),
+    db: AsyncSession = Depends(get_session),
 ):
-    crud.delete_entry(entry_id)
+    state = await crud.delete_entry_async(entry_id, sess=db, refresh=include_state)
+    if include_state:
+        return {"status": "deleted", "monthly": state.monthly, "summary": state.summary}
     return {"status": "deleted"}
 
 
 
 from fastapi import FastAPI, Depends, HTTPException, Query
 from fastapi.responses import StreamingResponse
-from excel_service import ExcelExportService
 import io
 import crud
 import models
@@ -126,6 +365,13 @@ from database import engine
 from sqlalchemy.orm import Session
 
 
+def iter_file(file, chunk_size: int = 64 * 1024):
+    """Yield a file's contents in chunks, closing it once exhausted"""
+    with file:
+        while chunk := file.read(chunk_size):
+            yield chunk
+
+
 @app.get("/home/{home_id}/meters/{meter_id}/export-excel")
 async def export_meter_excel(
     home_id: str,
@@ -135,20 +381,92 @@ async def export_meter_excel(
 ):
     """Export meter readings to Excel for a specific year"""
     try:
-        # All the heavy lifting is done in crud.py
-        excel_buffer = crud.create_excel_export(meter_id, year)
+        # Key on the data version before building, so a write that lands
+        # mid-build leaves the result under an already stale key
+        key = await export_key_async(meter_id, year, meter_name)
+        cached = export_cache.get(key)
+        if cached is not None:
+            excel_file = io.BytesIO(cached)
+        else:
+            # All the heavy lifting is done in crud.py, off the event loop
+            excel_file = await export_pool.run(crud.create_excel_export, meter_id, year)
+            export_cache.put_file(key, excel_file)
+        size = excel_file.seek(0, io.SEEK_END)
+        excel_file.seek(0)
         
         # Create filename
         filename = f"{meter_name}_{year}_readings.xlsx"
         
         return StreamingResponse(
-            io.BytesIO(excel_buffer.read()),
+            iter_file(excel_file),
             media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
             headers={
                 "Content-Disposition": f"attachment; filename={filename}",
+                "Content-Length": str(size),
                 "Content-Type": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
             }
         )
         
+    except PoolSaturated:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many exports in progress, try again shortly",
+            headers={"Retry-After": "5"},
+        )
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Excel export failed: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Excel export failed: {str(e)}")
+
+
+async def export_archive(meters, from_year: int | None, to_year: int | None, filename: str):
+    this_year = datetime.datetime.now().year
+    # Open ends default to the current year
+    to_year = to_year or max(from_year or this_year, this_year)
+    from_year = from_year or min(to_year, this_year)
+    if to_year < from_year:
+        raise HTTPException(status_code=400, detail="to_year is before from_year")
+    years = range(from_year, to_year + 1)
+    if not meters:
+        raise HTTPException(status_code=404, detail="No meters to export")
+    if len(meters) * len(years) > MAX_WORKBOOKS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_WORKBOOKS} workbooks (meters x years) per archive",
+        )
+    if archive_pool.saturated():
+        raise HTTPException(
+            status_code=503,
+            detail="Too many exports in progress, try again shortly",
+            headers={"Retry-After": "5"},
+        )
+    return StreamingResponse(
+        stream_archive(meters, years),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={filename}_{from_year}-{to_year}.zip"},
+    )
+
+
+@app.get("/home/{home_id}/export-archive")
+async def export_home_archive(
+    home_id: str,
+    meter_id: Optional[List[str]] = Query(None, description="repeat to pick meters; all by default"),
+    from_year: Optional[int] = Query(None, ge=2000),
+    to_year: Optional[int] = Query(None, ge=2000),
+    db: AsyncSession = Depends(get_session),
+):
+    """A zip of yearly workbooks for a household's meters over a range of years"""
+    meters = await crud.get_export_meters_async(home_id, meter_id, sess=db)
+    return await export_archive(meters, from_year, to_year, "household")
+
+
+@app.get("/export-archive")
+async def export_meters_archive(
+    meter_id: List[str] = Query(..., description="repeat for each meter, from any household"),
+    from_year: Optional[int] = Query(None, ge=2000),
+    to_year: Optional[int] = Query(None, ge=2000),
+    db: AsyncSession = Depends(get_session),
+):
+    """As /home/{home_id}/export-archive, for meters across households"""
+    meters = await crud.get_export_meters_async(None, meter_id, sess=db)
+    return await export_archive(meters, from_year, to_year, "meters")
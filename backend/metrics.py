@@ -0,0 +1,154 @@
+# metrics.py
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Upper bounds, in seconds, of the latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class StatementStats:
+    """SQL statements run, and seconds spent in them, within one request."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.seconds = 0.0
+
+    def record(self, seconds: float):
+        # Crud work may run on pool threads while the request waits
+        with self._lock:
+            self.count += 1
+            self.seconds += seconds
+
+
+_current: ContextVar[StatementStats | None] = ContextVar("statement_stats", default=None)
+
+
+@contextmanager
+def track_statements():
+    """
+    Count the SQL statements run in the block, on any engine, and their DB
+    time. Work handed to threads is included when they run in a copy of
+    the caller's context (asyncio.to_thread, FastAPI's threadpool,
+    AsyncSession.run_sync).
+    """
+    stats = StatementStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+# The start time rides on the statement's execution context rather than
+# on the connection, so a statement that fails (and never reaches
+# after_cursor_execute) leaves nothing behind to skew the next one
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.statement_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "statement_started", None)
+    stats = _current.get()
+    if stats is not None and started is not None:
+        stats.record(time.perf_counter() - started)
+
+
+class Histogram:
+    """Cumulative latency histogram per label set, Prometheus style."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, labels: tuple, seconds: float):
+        with self._lock:
+            counts, total = self._series.get(labels, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self._series[labels] = (counts, total + seconds)
+
+    def series(self):
+        with self._lock:
+            return [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+
+
+class Counter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, labels: tuple, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def series(self):
+        with self._lock:
+            return list(self._values.items())
+
+
+request_seconds = Histogram()
+db_statements = Counter()
+db_seconds = Counter()
+
+
+def observe_request(method: str, route: str, status: int, seconds: float, stats: StatementStats):
+    request_seconds.observe((method, route, str(status)), seconds)
+    db_statements.inc((method, route), stats.count)
+    db_seconds.inc((method, route), stats.seconds)
+
+
+def server_timing(seconds: float, stats: StatementStats) -> str:
+    """Server-Timing header value: DB time with its statement count, and the total."""
+    return (
+        f'db;dur={stats.seconds * 1000:.1f};desc="{stats.count} statements", '
+        f"total;dur={seconds * 1000:.1f}"
+    )
+
+
+def _labels(names, values) -> str:
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"') for v in values)
+    return ",".join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+
+def render(gauges: dict[str, float] | None = None, counters: dict[str, float] | None = None) -> str:
+    """
+    All metrics in the Prometheus text exposition format, plus unlabelled
+    `gauges` and `counters` kept elsewhere.
+    """
+    lines = [
+        "# HELP http_request_duration_seconds Request latency by route.",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    names = ("method", "route", "status")
+    for labels, counts, total in sorted(request_seconds.series()):
+        label_text = _labels(names, labels)
+        running = 0
+        for bound, count in zip((*request_seconds.buckets, "+Inf"), counts):
+            running += count
+            lines.append(f'http_request_duration_seconds_bucket{{{label_text},le="{bound}"}} {running}')
+        lines.append(f"http_request_duration_seconds_sum{{{label_text}}} {total}")
+        lines.append(f"http_request_duration_seconds_count{{{label_text}}} {running}")
+
+    for name, help_text, counter in (
+        ("db_statements_total", "SQL statements run by route.", db_statements),
+        ("db_seconds_total", "Seconds spent in SQL statements by route.", db_seconds),
+    ):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for labels, value in sorted(counter.series()):
+            lines.append(f"{name}{{{_labels(('method', 'route'), labels)}}} {value}")
+
+    for kind, values in (("gauge", gauges), ("counter", counters)):
+        for name, value in (values or {}).items():
+            lines += [f"# TYPE {name} {kind}", f"{name} {value}"]
+    return "\n".join(lines) + "\n"
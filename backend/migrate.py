@@ -0,0 +1,27 @@
+# migrate.py
+# Usage: python migrate.py
+# Adds the columns and builds the indexes declared on the models that
+# existing tables lack. Run it before deploying a release that adds
+# either; the API only warns. Rollups are rebuilt when duplicate rows had
+# to be deleted first, since they may have been built from a deleted one.
+
+import crud
+import models  # noqa: F401, registers the tables on the metadata
+from database import missing_columns, missing_indexes, migrate_db
+from logging_config import configure_logging
+
+configure_logging()
+
+columns = missing_columns()
+indexes = missing_indexes()
+if not columns and not indexes:
+    print("✅ All columns and indexes present")
+else:
+    deleted = migrate_db()
+    if columns:
+        print(f"✅ Added {len(columns)} columns: {', '.join(f'{c.table.name}.{c.name}' for c in columns)}")
+    if indexes:
+        print(f"✅ Created {len(indexes)} indexes: {', '.join(index.name for index in indexes)}")
+    if deleted:
+        count = crud.rebuild_rollups()
+        print(f"✅ Deleted {deleted} duplicate rows and rebuilt {count} monthly rollups")
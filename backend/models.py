@@ -1,5 +1,7 @@
 # models.py
+import bisect
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import Index
 from typing import List, Optional
 from uuid import UUID, uuid4
 import datetime
@@ -9,9 +11,26 @@ from datetime import datetime, date
 
 PK_TZ = pytz.timezone("Asia/Karachi")
 
+# Monthly units at which consumption enters the next billing band
+THRESHOLDS = (170, 180, 190, 200)
+
+def threshold_level(units: float) -> int:
+    """Danger level 0-4: how many thresholds units is above."""
+    return bisect.bisect_left(THRESHOLDS, units)
+
+def threshold_band(units: float) -> int:
+    """Highest threshold units has reached, 0 for none."""
+    return (0, *THRESHOLDS)[bisect.bisect_right(THRESHOLDS, units)]
+
 def pk_now():
     return datetime.now(PK_TZ)
 
+def pk_wall_clock(value: datetime) -> datetime:
+    """Naive Pakistan time, as reading_time is stored, for an aware datetime."""
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(PK_TZ).replace(tzinfo=None)
+    return value
+
 class Meter(SQLModel, table=True):
     id: UUID = Field(default=None, primary_key=True)
     name: str
@@ -23,6 +42,9 @@ class Meter(SQLModel, table=True):
     readings:       List["Reading"]      = Relationship(back_populates="meter")
 
 class StartReading(SQLModel, table=True):
+    __table_args__ = (
+        Index("uq_startreading_meter_year_month", "meter_id", "year", "month", unique=True),
+    )
     id: UUID = Field(default_factory=uuid4, primary_key=True)
     meter_id: UUID = Field(foreign_key="meter.id")
     year: int
@@ -33,6 +55,11 @@ class StartReading(SQLModel, table=True):
 
 class Reading(SQLModel, table=True):
     __tablename__ = "readings"
+    __table_args__ = (
+        Index("ix_readings_meter_date_time", "meter_id", "reading_date", "reading_time"),
+        # keyset pagination order for range reads
+        Index("ix_readings_meter_time_id", "meter_id", "reading_time", "id"),
+    )
     id: UUID = Field(default_factory=uuid4, primary_key=True)
     meter_id: UUID = Field(foreign_key="meter.id")
     
@@ -41,3 +68,55 @@ class Reading(SQLModel, table=True):
     reading_value: float
     posted_by: str = Field(default="")
     meter: Meter = Relationship(back_populates="readings")
+
+class MonthlyRollup(SQLModel, table=True):
+    """
+    Per meter/month aggregates kept in step with readings and start
+    readings by crud, so dashboard reads need not scan raw readings.
+    """
+    __tablename__ = "monthly_rollup"
+    meter_id: UUID = Field(foreign_key="meter.id", primary_key=True)
+    year: int = Field(primary_key=True)
+    month: int = Field(primary_key=True)
+    start_value: Optional[float] = None
+    latest_value: Optional[float] = None
+    latest_time: Optional[datetime] = None
+    entry_count: int = Field(default=0)
+    consumption: float = Field(default=0.0)
+
+    def refresh_consumption(self):
+        if self.entry_count and self.latest_value is not None:
+            self.consumption = self.latest_value - (self.start_value or 0.0)
+        else:
+            self.consumption = 0.0
+
+class MeterStats(SQLModel, table=True):
+    """
+    Running per-meter statistics for the billing month being tracked,
+    folded in one reading at a time by anomalies.observe.
+    """
+    __tablename__ = "meter_stats"
+    meter_id: UUID = Field(foreign_key="meter.id", primary_key=True)
+    year: int
+    month: int
+    start_value: float = Field(default=0.0)
+    last_value: float = Field(default=0.0)
+    last_time: datetime
+    daily_rate: Optional[float] = None      # EWMA of units per day
+    projected_units: Optional[float] = None
+    projected_band: int = Field(default=0)
+
+class MeterAlert(SQLModel, table=True):
+    __tablename__ = "meter_alert"
+    __table_args__ = (
+        Index("ix_meter_alert_meter_time", "meter_id", "reading_time"),
+        Index("ix_meter_alert_reading", "reading_id"),
+    )
+    id: UUID = Field(default_factory=uuid4, primary_key=True)
+    meter_id: UUID = Field(foreign_key="meter.id")
+    # The reading that raised it; deleted along with that reading
+    reading_id: Optional[UUID] = Field(default=None, foreign_key="readings.id")
+    kind: str                               # drop, spike or overrun
+    detail: str
+    reading_value: float
+    reading_time: datetime
@@ -0,0 +1,129 @@
+# read_cache.py
+import os
+import threading
+import time
+import uuid
+
+from sqlalchemy.util.concurrency import await_only, in_greenlet
+
+
+class LocalBackend:
+    """In-process backend. Each uvicorn worker gets its own copy."""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._values = {}
+        self._counters = {}
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            item = self._values.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self._values[key]
+                return None
+            return value
+
+    def set(self, key: str, value: str, ttl: float):
+        with self._lock:
+            now = time.monotonic()
+            if len(self._values) >= self.max_entries:
+                self._values = {k: v for k, v in self._values.items() if v[1] >= now}
+            self._values[key] = (value, now + ttl)
+
+    def get_counter(self, key: str) -> int:
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+
+class RedisBackend:
+    """
+    Shared backend so several workers see the same entries and invalidations.
+    Calls made on the event loop, inside AsyncSession.run_sync or
+    greenlet_spawn, go through the asyncio client and are awaited there;
+    calls from plain threads use the blocking client.
+    """
+
+    def __init__(self, url: str):
+        try:
+            import redis
+            import redis.asyncio
+        except ImportError as e:
+            raise RuntimeError("READ_CACHE_URL is set but the redis package is not installed") from e
+        self._redis = redis.Redis.from_url(url)
+        self._async_redis = redis.asyncio.Redis.from_url(url)
+
+    def _call(self, command: str, *args, **kwargs):
+        if in_greenlet():
+            return await_only(getattr(self._async_redis, command)(*args, **kwargs))
+        return getattr(self._redis, command)(*args, **kwargs)
+
+    def get(self, key: str) -> str | None:
+        value = self._call("get", key)
+        return value.decode() if value is not None else None
+
+    def set(self, key: str, value: str, ttl: float):
+        self._call("set", key, value, px=int(ttl * 1000))
+
+    def get_counter(self, key: str) -> int:
+        return int(self._call("get", key) or 0)
+
+    def incr(self, key: str) -> int:
+        return self._call("incr", key)
+
+
+class ReadCache:
+    """
+    TTL cache for read results, scoped per household.
+    Invalidating a scope bumps its version; entries are stored under the
+    version that was current when their query started, so a result computed
+    concurrently with a write can never be served after that write.
+    """
+
+    def __init__(self, backend, ttl: float, prefix: str = "readcache"):
+        self.backend = backend
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        # Tags built from versions carry this, since in-process versions
+        # start again from 0 after a restart
+        self.epoch = uuid.uuid4().hex[:8]
+
+    def version(self, scope: str) -> int:
+        return self.backend.get_counter(f"{self.prefix}:version:{scope}")
+
+    def get(self, name: str, scope: str, version: int) -> str | None:
+        value = self.backend.get(f"{self.prefix}:{name}:{scope}:{version}")
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, name: str, scope: str, version: int, value: str):
+        self.backend.set(f"{self.prefix}:{name}:{scope}:{version}", value, self.ttl)
+
+    def invalidate(self, scope: str):
+        self.backend.incr(f"{self.prefix}:version:{scope}")
+
+    def etag(self, scope: str, *parts) -> str:
+        """Strong ETag for everything derived from `scope` at its current version."""
+        tag = "-".join(str(p) for p in (self.epoch, self.version(scope), *parts))
+        return f'"{tag}"'
+
+
+def _backend_from_env():
+    url = os.getenv("READ_CACHE_URL")
+    return RedisBackend(url) if url else LocalBackend()
+
+
+read_cache = ReadCache(_backend_from_env(), ttl=float(os.getenv("READ_CACHE_TTL", "30")))
@@ -0,0 +1,19 @@
+# rollups.py
+# Usage: python rollups.py rebuild|check [--meter METER_ID]
+import argparse
+import crud
+
+parser = argparse.ArgumentParser(description="Maintain the monthly_rollup table")
+parser.add_argument("command", choices=["rebuild", "check"])
+parser.add_argument("--meter", help="limit to one meter id")
+args = parser.parse_args()
+
+if args.command == "rebuild":
+    count = crud.rebuild_rollups(args.meter)
+    print(f"✅ Rebuilt {count} monthly rollups")
+else:
+    problems = crud.check_rollups(args.meter)
+    for problem in problems:
+        print(problem)
+    print("✅ Rollups match readings" if not problems else f"❌ {len(problems)} mismatches")
+    raise SystemExit(1 if problems else 0)
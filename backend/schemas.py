@@ -1,8 +1,9 @@
 # schemas.py
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 from uuid import UUID
 import datetime
-from typing import List
+from typing import Any, Dict, List, Optional
+from models import pk_wall_clock
 
 class MeterOut(BaseModel):
     id: UUID
@@ -27,4 +28,64 @@ class MonthlyData(BaseModel):
 class HomeSummary(BaseModel):        # NEW schema
     meters: List[MeterOut]
     home_total: float
-    home_current_month: float
\ No newline at end of file
+    home_current_month: float
+
+class RefreshedState(BaseModel):
+    monthly: MonthlyData
+    summary: HomeSummary
+
+
+class BulkReadingIn(BaseModel):
+    meter_id: UUID
+    date: datetime.date
+    reading: float
+    name: str = ""
+    time: Optional[datetime.datetime] = None
+
+    @field_validator("time")
+    @classmethod
+    def _pk_time(cls, value):
+        # Offsets are accepted; stored times are naive Pakistan wall-clock
+        return pk_wall_clock(value)
+
+class BulkRowError(BaseModel):
+    row: int                     # index of the row in the upload, from 0
+    detail: str
+
+class BulkResult(BaseModel):
+    inserted: int
+    levels: List[Optional[int]]  # per row, None where the row was rejected
+    errors: List[BulkRowError]
+
+
+class ReadingPage(BaseModel):
+    readings: List[Dict[str, Any]]
+    next_cursor: Optional[str]   # pass back as `after` for the next page; None on the last
+
+
+class ConsumptionBucket(BaseModel):
+    start: datetime.date         # first day of the bucket
+    units: float
+
+class ConsumptionSeries(BaseModel):
+    bucket: str
+    buckets: List[ConsumptionBucket]
+
+
+class AlertOut(BaseModel):
+    kind: str                    # drop, spike or overrun
+    detail: str
+    reading: float
+    time: datetime.datetime
+
+class MeterInsight(BaseModel):
+    meter_id: UUID
+    name: str
+    year: Optional[int]          # billing month the stats track
+    month: Optional[int]
+    units_so_far: float
+    daily_rate: Optional[float]
+    projected_units: Optional[float]
+    projected_band: int
+    recent_daily_units: Optional[float]  # average over the last few days of this month
+    alerts: List[AlertOut]
@@ -31,8 +31,6 @@ def get_monthly_data(meter_id: str, year: int, month: int) -> schemas.MonthlyDat
             )
             .order_by(models.Reading.reading_time.desc())
         ).all()
-        print(entries)
-        print("ashar")
         return schemas.MonthlyData(
             start_reading=start_val,
             entries=[
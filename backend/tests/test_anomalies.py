@@ -0,0 +1,108 @@
+# tests/test_anomalies.py
+import datetime
+import uuid
+
+import pytest
+from sqlmodel import select
+
+import anomalies
+import crud
+import models
+from conftest import seed
+
+
+def stats_at(value: float = 1000.0, daily_rate: float | None = 5.0) -> models.MeterStats:
+    """Stats for March 2025 with one reading in, on the 10th at midnight."""
+    stats = anomalies.new_stats(uuid.uuid4(), 2025, 3, 1000.0)
+    stats.last_value, stats.last_time = value, datetime.datetime(2025, 3, 10)
+    stats.daily_rate = daily_rate
+    return stats
+
+
+def day(n: int, hour: int = 0) -> datetime.datetime:
+    return datetime.datetime(2025, 3, n, hour)
+
+
+def kinds(alerts) -> list[str]:
+    return [kind for kind, _ in alerts]
+
+
+def test_drop_is_reported_and_not_folded_in():
+    stats = stats_at(value=1040.0)
+    assert kinds(anomalies.observe(stats, 2025, 3, day(11), 1030.0, 1000.0)) == ["drop"]
+    assert (stats.last_value, stats.last_time, stats.daily_rate) == (1040.0, day(10), 5.0)
+    # The next good reading is measured from the last one before the drop
+    assert anomalies.observe(stats, 2025, 3, day(11), 1045.0, 1000.0) == []
+    assert stats.last_value == 1045.0
+
+
+def test_spike_needs_both_factor_and_minimum_units():
+    stats = stats_at(daily_rate=1.0)
+    # 16x the usual rate, but under SPIKE_MIN_UNITS
+    assert anomalies.observe(stats, 2025, 3, day(10, 6), 1004.0, 1000.0) == []
+    rate = stats.daily_rate
+    rise = anomalies.SPIKE_MIN_UNITS + 5
+    alerts = anomalies.observe(stats, 2025, 3, day(10, 12), 1004.0 + rise, 1000.0)
+    assert kinds(alerts) == ["spike"]
+    # A spike does not drag the usual rate up with it
+    assert stats.daily_rate == rate
+    assert stats.last_value == 1004.0 + rise
+
+
+def test_overrun_is_reported_once_per_band():
+    stats = stats_at(value=1100.0)
+    # 100 units by the 10th at 5 a day: 205 by month end
+    alerts = anomalies.observe(stats, 2025, 3, day(11), 1105.0, 1000.0)
+    assert kinds(alerts) == ["overrun"]
+    assert stats.projected_band == 200
+    assert anomalies.observe(stats, 2025, 3, day(12), 1110.0, 1000.0) == []
+
+
+def test_new_month_starts_over_but_keeps_the_rate():
+    stats = stats_at(value=1150.0, daily_rate=2.0)
+    assert anomalies.observe(stats, 2025, 4, datetime.datetime(2025, 4, 2), 1152.0, 1150.0) == []
+    assert (stats.year, stats.month, stats.start_value) == (2025, 4, 1150.0)
+    assert stats.last_value == 1152.0
+    assert stats.daily_rate == pytest.approx(2.0)
+    assert stats.projected_band == 0
+    # A late reading for the month before is left alone
+    assert anomalies.observe(stats, 2025, 3, day(31), 1155.0, 1000.0) == []
+    assert (stats.month, stats.last_value) == (4, 1152.0)
+
+
+def test_deleting_a_reading_removes_its_alerts_and_replays_stats(sess):
+    meter_id = seed(meters=1, months=1, readings_per_month=0, household_token="anomaly-household")[0]
+    today = datetime.date.today()
+    first_day = today.replace(day=1)
+
+    def add(value, hour):
+        crud.add_reading(
+            str(meter_id), first_day, value, "test", datetime.datetime.combine(first_day, datetime.time(hour))
+        )
+        return sess.exec(
+            select(models.Reading.id).where(models.Reading.meter_id == meter_id, models.Reading.reading_value == value)
+        ).one()
+
+    add(1001.0, 0)
+    add(1002.0, 12)
+    typo = add(990.0, 18)
+    stats_before = sess.get(models.MeterStats, meter_id).model_dump()
+
+    alerts = sess.exec(select(models.MeterAlert).where(models.MeterAlert.meter_id == meter_id)).all()
+    assert [(alert.kind, alert.reading_id) for alert in alerts] == [("drop", typo)]
+
+    crud.delete_entry(str(typo))
+    sess.expire_all()
+    assert sess.exec(select(models.MeterAlert).where(models.MeterAlert.meter_id == meter_id)).all() == []
+    assert sess.get(models.MeterStats, meter_id).model_dump() == stats_before
+
+    # Taking out the latest good reading winds the stats back to the one before
+    second = sess.exec(
+        select(models.Reading.id).where(models.Reading.meter_id == meter_id, models.Reading.reading_value == 1002.0)
+    ).one()
+    crud.delete_entry(str(second))
+    sess.expire_all()
+    stats = sess.get(models.MeterStats, meter_id)
+    assert (stats.last_value, stats.last_time.hour) == (1001.0, 0)
+    assert stats.daily_rate is None
+    assert crud.check_rollups(meter_id) == []
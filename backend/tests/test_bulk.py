@@ -0,0 +1,127 @@
+# tests/test_bulk.py
+import asyncio
+import datetime
+import time
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+import crud
+import main
+from conftest import seed
+
+TOKEN = "bulk-household"
+
+
+@pytest.fixture(scope="module")
+def meters():
+    # Start readings for this month and the last, no readings yet
+    return seed(meters=2, months=2, readings_per_month=0, household_token=TOKEN)
+
+
+@pytest.fixture(scope="module")
+def client():
+    return TestClient(main.app)
+
+
+def this_month() -> datetime.date:
+    return datetime.date.today().replace(day=1)
+
+
+def test_json_upload_reports_rejected_rows(client, meters):
+    day = this_month().isoformat()
+    next_year = this_month().replace(year=this_month().year + 1).isoformat()
+    rows = [
+        {"meter_id": str(meters[0]), "date": day, "reading": 1100, "time": f"{day}T08:00:00"},
+        {"meter_id": str(uuid.uuid4()), "date": day, "reading": 5},
+        {"meter_id": str(meters[0]), "date": "not-a-date", "reading": 5},
+        {"meter_id": str(meters[0]), "date": next_year, "reading": 5},
+        {"meter_id": str(meters[0]), "date": day, "reading": "lots"},
+        # Offset-aware: stored as Pakistan wall-clock time
+        {"meter_id": str(meters[0]), "date": day, "reading": 1190, "time": f"{day}T05:00:00Z"},
+    ]
+    response = client.post(f"/home/{TOKEN}/readings/bulk", json=rows)
+    assert response.status_code == 200
+    result = response.json()
+
+    assert result["inserted"] == 2
+    assert result["levels"] == [0, None, None, None, None, 2]
+    errors = {error["row"]: error["detail"] for error in result["errors"]}
+    assert sorted(errors) == [1, 2, 3, 4]
+    assert errors[1] == "Meter not found"
+    assert errors[2].startswith("date:")
+    assert errors[3].startswith("Start reading not set")
+    assert errors[4].startswith("reading:")
+    assert crud.check_rollups(meters[0]) == []
+
+    monthly = crud.get_monthly_data(str(meters[0]), this_month().year, this_month().month)
+    times = sorted(entry.time for entry in monthly.entries)
+    assert times == [
+        datetime.datetime.combine(this_month(), datetime.time(8)),
+        datetime.datetime.combine(this_month(), datetime.time(10)),
+    ]
+
+
+def test_csv_upload(client, meters):
+    last_month = (this_month() - datetime.timedelta(days=1)).replace(day=1).isoformat()
+    body = "\n".join([
+        "meter_id,date,reading,name,time",
+        f"{meters[1]},{last_month},1010,csv,",
+        f"{meters[1]},{last_month},1020,csv,",
+        f"{meters[1]},{last_month},1015,csv,{last_month}T06:00:00",
+        f"{meters[1]},{last_month},1015,csv,{last_month}T06:00:00",
+        f"{meters[1]},{last_month},,csv,",
+    ])
+    response = client.post(
+        f"/home/{TOKEN}/readings/bulk", content=body, headers={"Content-Type": "text/csv"}
+    )
+    assert response.status_code == 200
+    result = response.json()
+    assert result["inserted"] == 4
+    assert [error["row"] for error in result["errors"]] == [4]
+    # Equal and missing times are tie-broken the same way as compute_rollups
+    assert crud.check_rollups(meters[1]) == []
+
+
+@pytest.mark.parametrize("body, content_type", [
+    (b"{not json", "application/json"),
+    (b'{"meter_id": "x"}', "application/json"),
+    (b"\xff\xfe\x00", "text/csv"),
+])
+def test_malformed_upload_is_rejected(client, body, content_type):
+    response = client.post(
+        f"/home/{TOKEN}/readings/bulk", content=body, headers={"Content-Type": content_type}
+    )
+    assert response.status_code == 400
+
+
+def test_bulk_import_leaves_event_loop_free(meters):
+    day = this_month().isoformat()
+    rows = [
+        {"meter_id": str(meters[0]), "date": day, "reading": 1200 + i * 0.001}
+        for i in range(20000)
+    ]
+
+    async def import_while_ticking():
+        gaps = []
+
+        async def tick():
+            last = time.perf_counter()
+            while True:
+                await asyncio.sleep(0.001)
+                now = time.perf_counter()
+                gaps.append(now - last)
+                last = now
+
+        ticker = asyncio.create_task(tick())
+        result = await crud.add_readings_bulk_async(TOKEN, rows)
+        ticker.cancel()
+        return result, max(gaps)
+
+    result, longest_stall = asyncio.run(import_while_ticking())
+    assert result.inserted == len(rows)
+    # Run on the loop (through run_sync) this stalls it for well over
+    # half a second; in a worker thread the loop keeps ticking
+    assert longest_stall < 0.3
+    assert crud.check_rollups(meters[0]) == []
@@ -0,0 +1,168 @@
+# tests/test_compression.py
+import asyncio
+import datetime
+import gzip
+import zlib
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+import compression
+import main
+from compression import CompressionMiddleware, choose_encoding
+from conftest import HOUSEHOLD
+
+MIN_SIZE = 1024
+XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CHUNKS = [f"chunk {n:04d} ".encode() * 100 for n in range(5)]
+
+
+async def text(request):
+    size = int(request.query_params["size"])
+    return PlainTextResponse("x" * size, headers={"ETag": '"v1"'})
+
+
+async def stream(request):
+    async def chunks():
+        for chunk in CHUNKS:
+            yield chunk
+    return StreamingResponse(chunks(), media_type="text/plain")
+
+
+async def xlsx(request):
+    return Response(b"x" * 4096, media_type=XLSX)
+
+
+async def zipped(request):
+    return Response(b"x" * 4096, media_type="application/zip")
+
+
+async def not_modified(request):
+    return Response(status_code=304, headers={"ETag": '"v1"'})
+
+
+app = CompressionMiddleware(
+    Starlette(routes=[
+        Route("/text", text),
+        Route("/stream", stream),
+        Route("/xlsx", xlsx),
+        Route("/zip", zipped),
+        Route("/not-modified", not_modified),
+    ]),
+    min_size=MIN_SIZE,
+)
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+def get(client, url, accept="gzip"):
+    return client.get(url, headers={"Accept-Encoding": accept})
+
+
+@pytest.mark.parametrize("size, encoded", [(MIN_SIZE - 1, False), (MIN_SIZE, True), (50_000, True)])
+def test_size_threshold(client, size, encoded):
+    response = get(client, f"/text?size={size}")
+    assert response.status_code == 200
+    assert (response.headers.get("Content-Encoding") == "gzip") is encoded
+    assert response.text == "x" * size
+    if encoded:
+        assert int(response.headers["Content-Length"]) < size
+        assert "Accept-Encoding" in response.headers["Vary"]
+
+
+@pytest.mark.parametrize("accept, expected", [
+    ("", None),
+    ("identity", None),
+    ("gzip", "gzip"),
+    ("GZIP;q=0.5", "gzip"),
+    ("gzip;q=0", None),
+    ("*", "br"),
+    ("*;q=0", None),
+    ("gzip, br", "br"),
+    ("gzip;q=1.0, br;q=0.8", "gzip"),
+    ("br;q=0.8, gzip;q=0.8", "br"),
+    ("br;q=0, *", "gzip"),
+    ("gzip;q=oops, br;q=0.1", "br"),
+])
+def test_q_value_negotiation(monkeypatch, accept, expected):
+    # Negotiation only needs to know brotli is there, not to run it
+    monkeypatch.setattr(compression, "brotli", object())
+    assert choose_encoding(accept) == expected
+
+
+@pytest.mark.parametrize("accept, expected", [("br", None), ("br, gzip;q=0.1", "gzip"), ("*", "gzip")])
+def test_negotiation_without_brotli(monkeypatch, accept, expected):
+    monkeypatch.setattr(compression, "brotli", None)
+    assert choose_encoding(accept) == expected
+
+
+def test_streamed_body_is_compressed_chunk_by_chunk():
+    scope = {
+        "type": "http", "method": "GET", "path": "/stream", "raw_path": b"/stream", "root_path": "",
+        "scheme": "http", "query_string": b"", "server": ("testserver", 80),
+        "headers": [(b"accept-encoding", b"gzip")],
+    }
+    sent = []
+
+    async def receive():
+        # No disconnect: the client stays until the body is done
+        await asyncio.Event().wait()
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    headers = dict(sent[0]["headers"])
+    assert headers[b"content-encoding"] == b"gzip"
+    assert b"content-length" not in headers
+    bodies = [message["body"] for message in sent[1:]]
+    assert [message["more_body"] for message in sent[1:]] == [True] * len(CHUNKS) + [False]
+    # Each chunk is sync-flushed, so it decodes as soon as it arrives
+    decoder = zlib.decompressobj(31)
+    for chunk, body in zip(CHUNKS, bodies):
+        assert decoder.decompress(body) == chunk
+    assert gzip.decompress(b"".join(bodies)) == b"".join(CHUNKS)
+
+
+def test_304_passes_through(client):
+    response = get(client, "/not-modified")
+    assert response.status_code == 304
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["ETag"] == '"v1"'
+    assert response.content == b""
+
+
+@pytest.mark.parametrize("url", ["/xlsx", "/zip"])
+def test_compressed_media_types_are_skipped(client, url):
+    response = get(client, url)
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["Content-Length"] == "4096"
+    assert response.content == b"x" * 4096
+
+
+def test_etag_is_weakened_only_when_encoded(client):
+    assert get(client, f"/text?size={MIN_SIZE}").headers["ETag"] == 'W/"v1"'
+    assert get(client, f"/text?size={MIN_SIZE}", accept="identity").headers["ETag"] == '"v1"'
+    assert get(client, f"/text?size={MIN_SIZE - 1}").headers["ETag"] == '"v1"'
+
+
+def test_weak_etag_revalidates_on_the_app(household):
+    # A client holding the weakened tag still gets its 304
+    today = datetime.date.today()
+    url = f"/home/{HOUSEHOLD}/meters/{household[0]}/data?year={today.year}&month={today.month}"
+    # No lifespan: its shutdown would close the export pools for later tests
+    client = TestClient(main.app)
+    first = get(client, url)
+    assert first.headers["Content-Encoding"] == "gzip"
+    etag = first.headers["ETag"]
+    assert etag.startswith("W/")
+    cached = client.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert cached.status_code == 304
+    assert "Content-Encoding" not in cached.headers
@@ -0,0 +1,127 @@
+# tests/test_consumption.py
+import datetime
+import uuid
+
+import pytest
+from sqlalchemy import insert
+
+import crud
+import database
+import models
+
+D = datetime.date
+
+# 2024: January opens with a start reading, February has none (so it runs
+# on from January's last reading) and March has its own again.
+# 1 January 2024 is a Monday.
+STARTS = {(2024, 1): 1000.0, (2024, 3): 1150.0}
+READINGS = [
+    (datetime.datetime(2024, 1, 1, 10), 1010.0),
+    (datetime.datetime(2024, 1, 1, 20), 1015.0),
+    (datetime.datetime(2024, 1, 2, 9), 1030.0),
+    (datetime.datetime(2024, 1, 8, 9), 1050.0),
+    (datetime.datetime(2024, 1, 31, 9), 1100.0),
+    (datetime.datetime(2024, 2, 5, 9), 1120.0),
+    (datetime.datetime(2024, 2, 20, 9), 1150.0),
+    (datetime.datetime(2024, 3, 4, 9), 1160.0),
+    (datetime.datetime(2024, 3, 18, 9), 1190.0),
+]
+DAYS = {
+    D(2024, 1, 1): 15.0, D(2024, 1, 2): 15.0, D(2024, 1, 8): 20.0, D(2024, 1, 31): 50.0,
+    D(2024, 2, 5): 20.0, D(2024, 2, 20): 30.0, D(2024, 3, 4): 10.0, D(2024, 3, 18): 30.0,
+}
+WEEKS = {
+    D(2024, 1, 1): 30.0, D(2024, 1, 8): 20.0, D(2024, 1, 29): 50.0,
+    D(2024, 2, 5): 20.0, D(2024, 2, 19): 30.0, D(2024, 3, 4): 10.0, D(2024, 3, 18): 30.0,
+}
+MONTHS = {D(2024, 1, 1): 100.0, D(2024, 2, 1): 50.0, D(2024, 3, 1): 40.0}
+
+
+def add_meter(household_token: str, starts: dict, readings: list) -> uuid.UUID:
+    meter_id = uuid.uuid4()
+    with database.engine.begin() as conn:
+        conn.execute(insert(models.Meter.__table__).values(
+            id=meter_id, name=f"Meter {meter_id.hex[:4]}", household_token=household_token
+        ))
+        conn.execute(insert(models.StartReading.__table__), [
+            {"id": uuid.uuid4(), "meter_id": meter_id, "year": year, "month": month, "reading_value": value}
+            for (year, month), value in starts.items()
+        ])
+        conn.execute(insert(models.Reading.__table__), [
+            {
+                "id": uuid.uuid4(),
+                "meter_id": meter_id,
+                "reading_date": reading_time.date().replace(day=1),
+                "reading_time": reading_time,
+                "reading_value": value,
+                "posted_by": "test",
+            }
+            for reading_time, value in readings
+        ])
+    crud.rebuild_rollups(meter_id)
+    return meter_id
+
+
+@pytest.fixture
+def meter_id():
+    """A meter with the 2024 readings above, in a household of its own."""
+    return add_meter(f"consumption-{uuid.uuid4().hex[:8]}", STARTS, READINGS)
+
+
+def series(bucket: str, **kwargs) -> dict:
+    return {b.start: b.units for b in crud.get_consumption(bucket, **kwargs).buckets}
+
+
+@pytest.mark.parametrize("bucket, expected", [
+    ("day", DAYS),
+    ("week", WEEKS),
+    ("month", MONTHS),
+    ("year", {D(2024, 1, 1): 190.0}),
+])
+def test_buckets(meter_id, bucket, expected):
+    assert series(bucket, meter_id=meter_id) == pytest.approx(expected)
+
+
+def test_household_sums_its_meters(meter_id, sess):
+    household_token = sess.get(models.Meter, meter_id).household_token
+    add_meter(household_token, {(2024, 1): 0.0}, [(datetime.datetime(2024, 1, 15, 9), 5.0)])
+    months = series("month", household_token=household_token)
+    assert months == pytest.approx({**MONTHS, D(2024, 1, 1): 105.0})
+    weeks = series("week", household_token=household_token)
+    assert weeks == pytest.approx({**WEEKS, D(2024, 1, 15): 5.0})
+
+
+@pytest.mark.parametrize("bucket, start, end, expected", [
+    # start is inclusive and end exclusive, on the bucket's first day
+    ("day", D(2024, 1, 2), D(2024, 1, 8), {D(2024, 1, 2): 15.0}),
+    ("day", D(2024, 1, 8), D(2024, 1, 9), {D(2024, 1, 8): 20.0}),
+    # The first February reading still rises from January's last
+    ("day", D(2024, 2, 5), None, {k: v for k, v in DAYS.items() if k >= D(2024, 2, 5)}),
+    ("week", D(2024, 1, 8), D(2024, 2, 5), {D(2024, 1, 8): 20.0, D(2024, 1, 29): 50.0}),
+    ("month", D(2024, 2, 1), D(2024, 3, 1), {D(2024, 2, 1): 50.0}),
+    ("month", None, D(2024, 1, 1), {}),
+    ("year", D(2024, 1, 1), D(2025, 1, 1), {D(2024, 1, 1): 190.0}),
+    ("year", D(2024, 1, 2), None, {}),
+])
+def test_from_to_edges(meter_id, bucket, start, end, expected):
+    assert series(bucket, meter_id=meter_id, start=start, end=end) == pytest.approx(expected)
+
+
+def test_mid_month_start_reading_reset(meter_id):
+    # March's start corrected after its first reading is in
+    crud.set_start_reading(str(meter_id), 2024, 3, 1140.0)
+    assert series("month", meter_id=meter_id)[D(2024, 3, 1)] == pytest.approx(50.0)
+    days = series("day", meter_id=meter_id)
+    assert days[D(2024, 3, 4)] == pytest.approx(20.0)
+    assert days[D(2024, 3, 18)] == pytest.approx(30.0)
+    # Day and month series agree once it is reset
+    march = sum(units for day, units in days.items() if day.month == 3)
+    assert march == pytest.approx(50.0)
+    # February, which has no start reading, is unaffected
+    assert series("month", meter_id=meter_id)[D(2024, 2, 1)] == pytest.approx(50.0)
+
+
+def test_unknown_bucket_is_rejected(meter_id):
+    with pytest.raises(crud.HTTPException) as raised:
+        crud.get_consumption("hour", meter_id=meter_id)
+    assert raised.value.status_code == 400
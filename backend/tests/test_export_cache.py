@@ -0,0 +1,83 @@
+# tests/test_export_cache.py
+import datetime
+import types
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+
+import crud
+import database
+import export_cache as export_cache_module
+import main
+import models
+from conftest import seed
+from export_cache import DataVersions, export_cache
+from read_cache import read_cache
+
+
+@pytest.fixture(scope="module")
+def meter_id():
+    return seed(meters=1, months=2, readings_per_month=5, household_token="export-household")[0]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A frozen time.time for export_cache, moved on by hand."""
+    now = types.SimpleNamespace(value=1_000_000.0)
+    monkeypatch.setattr(export_cache_module, "time", types.SimpleNamespace(time=lambda: now.value))
+    return now
+
+
+def export(client, meter_id, year):
+    response = client.get(
+        f"/home/export-household/meters/{meter_id}/export-excel",
+        params={"meter_name": "Meter 0", "year": year},
+    )
+    assert response.status_code == 200
+    return response.content
+
+
+def test_repeat_export_is_served_from_cache(meter_id, clock):
+    client = TestClient(main.app)
+    year = datetime.date.today().year
+    first = export(client, meter_id, year)
+    hits = export_cache.hits
+    assert export(client, meter_id, year) == first
+    assert export_cache.hits == hits + 1
+
+
+def test_write_in_another_worker_invalidates_export(meter_id, clock):
+    client = TestClient(main.app)
+    year = datetime.date.today().year
+    export(client, meter_id, year)
+    # Another worker shares the backend, not this process's DataVersions
+    DataVersions(read_cache).bump(meter_id, year)
+    misses = export_cache.misses
+    export(client, meter_id, year)
+    assert export_cache.misses == misses + 1
+
+
+def test_write_outside_the_api_expires_with_ttl(meter_id, clock):
+    client = TestClient(main.app)
+    today = datetime.date.today()
+    before = export(client, meter_id, today.year)
+    # As a script would: straight to the database, then a rollup
+    # rebuild as rollups.py does, and no version bump
+    with database.engine.begin() as conn:
+        conn.execute(insert(models.Reading.__table__).values(
+            id=uuid.uuid4(),
+            meter_id=meter_id,
+            reading_date=today.replace(day=1),
+            reading_time=datetime.datetime.combine(today.replace(day=1), datetime.time(0, 0, 1)),
+            reading_value=1.0,
+            posted_by="script",
+        ))
+    crud.rebuild_rollups(meter_id)
+    assert export(client, meter_id, today.year) == before
+
+    clock.value += export_cache_module.EXPORT_CACHE_TTL
+    misses = export_cache.misses
+    export(client, meter_id, today.year)
+    assert export_cache.misses == misses + 1
@@ -0,0 +1,58 @@
+# tests/test_export_pool.py
+import io
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+
+import crud
+import main
+from conftest import HOUSEHOLD
+from export_pool import ExportPool
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """A one-slot export pool whose exports block until released."""
+    release = threading.Event()
+
+    def blocking_export(meter_id, year):
+        release.wait(timeout=30)
+        return io.BytesIO(b"xlsx")
+
+    pool = ExportPool(max_workers=1, max_queue=0)
+    monkeypatch.setattr(main, "export_pool", pool)
+    monkeypatch.setattr(crud, "create_excel_export", blocking_export)
+    yield pool, release
+    release.set()
+    pool.shutdown()
+
+
+def test_saturated_pool_rejects_without_blocking_other_routes(pool, household):
+    pool, release = pool
+    export_url = f"/home/{HOUSEHOLD}/meters/{household[0]}/export-excel"
+
+    def export():
+        # A fresh name each time, so the export cache cannot answer
+        return client.get(export_url, params={"meter_name": uuid.uuid4().hex, "year": 2000})
+
+    with TestClient(main.app) as client, ThreadPoolExecutor(max_workers=1) as executor:
+        first = executor.submit(export)
+        deadline = time.monotonic() + 10
+        while pool.in_flight == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert pool.saturated()
+
+        rejected = export()
+        assert rejected.status_code == 503
+        assert rejected.headers["Retry-After"] == "5"
+        # The event loop is free while the export holds the pool
+        assert client.get(f"/home/{HOUSEHOLD}/summary").status_code == 200
+        assert not first.done()
+
+        release.set()
+        assert first.result(timeout=10).status_code == 200
+    assert pool.in_flight == 0
@@ -0,0 +1,96 @@
+# tests/test_http_cache.py
+import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+import crud
+import main
+from conftest import seed
+
+HOUSEHOLD = "etag-household"
+# Validators as the handlers set them, before compression can weaken them
+IDENTITY = {"Accept-Encoding": "identity"}
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture
+def meter_id(monkeypatch):
+    """A fresh meter with this month's start reading and a few readings."""
+    # Hold the TTL bucket still, so only writes move the ETags
+    monkeypatch.setattr(crud, "_ttl_bucket", lambda: 0)
+    return seed(meters=1, months=1, readings_per_month=5, household_token=HOUSEHOLD)[0]
+
+
+def urls(meter_id) -> list[str]:
+    today = datetime.date.today()
+    data = f"/home/{HOUSEHOLD}/meters/{meter_id}/data?year={today.year}&month={today.month}"
+    return [
+        f"/home/{HOUSEHOLD}/meters",
+        f"/home/{HOUSEHOLD}/summary",
+        data,
+        f"{data}&format=columnar",
+    ]
+
+
+def get(client, url, etag=None):
+    headers = {**IDENTITY, **({"If-None-Match": etag} if etag else {})}
+    return client.get(url, headers=headers)
+
+
+@pytest.mark.parametrize("which", range(4))
+def test_if_none_match_gives_304(client, meter_id, which):
+    url = urls(meter_id)[which]
+    first = get(client, url)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert etag.startswith('"') and etag.endswith('"')
+    assert first.headers["Cache-Control"] == "private, no-cache"
+
+    for if_none_match in (etag, f"W/{etag}", f'"stale", {etag}', "*"):
+        cached = get(client, url, if_none_match)
+        assert cached.status_code == 304
+        assert cached.content == b""
+        assert cached.headers["ETag"] == etag
+        assert cached.headers["Cache-Control"] == "private, no-cache"
+
+    assert get(client, url, '"stale"').status_code == 200
+
+
+def test_etag_changes_after_a_write(client, meter_id):
+    today = datetime.date.today()
+    tags = {url: get(client, url).headers["ETag"] for url in urls(meter_id)}
+
+    response = client.post(
+        f"/home/{HOUSEHOLD}/meters/{meter_id}/entries",
+        json={"date": today.isoformat(), "reading": 5000.0, "name": "test"},
+    )
+    assert response.status_code == 200
+    for url, etag in tags.items():
+        fresh = get(client, url, etag)
+        assert fresh.status_code == 200
+        assert fresh.headers["ETag"] != etag
+        tags[url] = fresh.headers["ETag"]
+
+    client.post(
+        f"/home/{HOUSEHOLD}/meters/{meter_id}/startReading",
+        json={"year": today.year, "month": today.month, "reading": 900.0},
+    )
+    for url, etag in tags.items():
+        assert get(client, url, etag).status_code == 200
+
+
+def test_write_leaves_other_months_alone(client, meter_id):
+    last_month = crud._previous_month(datetime.date.today().replace(day=1))
+    url = f"/home/{HOUSEHOLD}/meters/{meter_id}/data?year={last_month.year}&month={last_month.month}"
+    etag = get(client, url).headers["ETag"]
+    client.post(
+        f"/home/{HOUSEHOLD}/meters/{meter_id}/entries",
+        json={"date": datetime.date.today().isoformat(), "reading": 5000.0, "name": "test"},
+    )
+    assert get(client, url, etag).status_code == 304
@@ -0,0 +1,27 @@
+# tests/test_import_budget.py
+import os
+
+import pytest
+
+import import_budget
+
+
+@pytest.fixture(autouse=True)
+def production_drivers(monkeypatch):
+    # import_times falls back to a Postgres URL, loading asyncpg and
+    # psycopg2 as production does rather than the suite's SQLite driver
+    monkeypatch.delenv("DATABASE_URL")
+
+
+def test_startup_skips_export_stack():
+    times = import_budget.import_times("main")
+    assert [name for name in import_budget.LAZY_MODULES if name in times] == []
+
+
+# Wall-clock import time swings with machine load, so the budget only runs
+# where it is set, e.g. IMPORT_BUDGET_MS=1000 on a quiet CI runner
+@pytest.mark.skipif("IMPORT_BUDGET_MS" not in os.environ, reason="IMPORT_BUDGET_MS not set")
+def test_import_time_within_budget():
+    # Fastest of three fresh interpreters, as import_budget.py reports it
+    best_ms = min(import_budget.import_times("main")["main"] for _ in range(3)) / 1000
+    assert best_ms <= import_budget.BUDGET_MS
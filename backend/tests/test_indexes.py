@@ -0,0 +1,165 @@
+# tests/test_indexes.py
+import datetime
+import os
+import subprocess
+import sys
+import uuid
+
+import pytest
+from sqlalchemy import event, insert, select, text
+
+import crud
+import database
+import models
+from conftest import BACKEND_DIR, seed
+
+BIG_HOUSEHOLD = "index-household"
+# Tables the hot reads must reach through an index, never a full scan
+INDEXED_TABLES = ("readings", "startreading", "monthly_rollup")
+# ANALYZE makes the planner pick the same indexes on the small seed; set
+# INDEX_TEST_LARGE=1 to check them on a production-sized one (~58k readings)
+SCALE = (
+    {"meters": 40, "months": 24, "readings_per_month": 60}
+    if os.getenv("INDEX_TEST_LARGE")
+    else {"meters": 8, "months": 6, "readings_per_month": 20}
+)
+
+
+@pytest.fixture(scope="module")
+def big_household():
+    """
+    Enough readings that a full scan would be the planner's last resort,
+    with ANALYZE statistics so it chooses on real numbers.
+    """
+    meter_ids = seed(**SCALE, household_token=BIG_HOUSEHOLD)
+    with database.engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+    return meter_ids
+
+
+def query_plans(call) -> list[str]:
+    """Run `call` and return the EXPLAIN QUERY PLAN lines of each statement it ran."""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(database.engine, "before_cursor_execute", capture)
+    try:
+        call()
+    finally:
+        event.remove(database.engine, "before_cursor_execute", capture)
+
+    plans = []
+    with database.engine.connect() as conn:
+        for statement, parameters in statements:
+            if not statement.lstrip().upper().startswith("SELECT"):
+                continue
+            rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+            plans += [row[-1] for row in rows]
+    return plans
+
+
+def full_scans(plans: list[str]) -> list[str]:
+    return [line for line in plans if any(line == f"SCAN {table}" for table in INDEXED_TABLES)]
+
+
+def test_monthly_data_uses_indexes(big_household):
+    today = datetime.date.today()
+    plans = query_plans(
+        lambda: crud.get_monthly_data(str(big_household[7]), today.year, today.month)
+    )
+    assert not full_scans(plans), plans
+    assert any("uq_startreading_meter_year_month" in line for line in plans), plans
+    assert any("INDEX ix_readings_meter_date_time" in line for line in plans), plans
+
+
+def test_meters_use_indexes(big_household):
+    plans = query_plans(lambda: crud.get_meters(BIG_HOUSEHOLD, cached=False))
+    assert not full_scans(plans), plans
+    assert any(line.startswith("SEARCH") and "monthly_rollup" in line for line in plans), plans
+    # The meter list is answered from rollups alone
+    assert not any("readings" in line or "startreading" in line for line in plans), plans
+
+
+def test_readings_page_uses_indexes(big_household):
+    this_month = datetime.datetime.combine(datetime.date.today().replace(day=1), datetime.time())
+    for start in (None, this_month):
+        plans = query_plans(lambda: crud.get_readings_page(str(big_household[1]), start=start, limit=50))
+        assert not full_scans(plans), plans
+        assert any("INDEX ix_readings_meter_time_id" in line for line in plans), plans
+        assert not any("TEMP B-TREE" in line for line in plans), plans
+
+
+@pytest.mark.parametrize("by", ["meter", "household"])
+def test_consumption_uses_indexes(big_household, by):
+    scope = {"meter_id": big_household[2]} if by == "meter" else {"household_token": BIG_HOUSEHOLD}
+    start = datetime.date.today().replace(day=1)
+    plans = query_plans(lambda: crud.get_consumption("day", start=start, **scope))
+    assert not full_scans(plans), plans
+    assert any("INDEX ix_readings_meter_date_time" in line for line in plans), plans
+    assert any("uq_startreading_meter_year_month" in line for line in plans), plans
+
+
+def test_add_reading_uses_indexes(big_household):
+    today = datetime.date.today()
+    meter_id = str(big_household[3])
+    latest = crud.get_monthly_data(meter_id, today.year, today.month).entries[0]
+    # At the month's latest time, so the tie is broken by looking up the
+    # readings already at that time
+    plans = query_plans(
+        lambda: crud.add_reading(meter_id, today, latest.reading + 1, "test", latest.time)
+    )
+    assert not full_scans(plans), plans
+    assert any("uq_startreading_meter_year_month" in line for line in plans), plans
+    assert any("SEARCH readings USING INDEX ix_readings_meter_time_id" in line for line in plans), plans
+
+
+def start_index():
+    return next(ix for ix in models.StartReading.__table__.indexes if ix.unique)
+
+
+def drop_start_index(conn):
+    start_index().drop(bind=conn)
+
+
+def test_migrate_builds_missing_indexes_and_drops_duplicates():
+    meter_id = seed(meters=1, months=1, readings_per_month=1, household_token="migrate-household")[0]
+    today = datetime.date.today()
+    starts = models.StartReading.__table__
+    with database.engine.begin() as conn:
+        drop_start_index(conn)
+        duplicate_ids = [uuid.uuid4() for _ in range(2)]
+        conn.execute(insert(starts), [
+            {"id": duplicate_id, "meter_id": meter_id, "year": today.year, "month": today.month, "reading_value": 5.0}
+            for duplicate_id in duplicate_ids
+        ])
+        all_ids = conn.execute(select(starts.c.id).where(starts.c.meter_id == meter_id)).scalars().all()
+    assert len(all_ids) == 3
+    assert start_index() in database.missing_indexes()
+
+    assert database.migrate_db() == 2
+
+    assert database.missing_indexes() == []
+    with database.engine.connect() as conn:
+        kept = conn.execute(starts.select().where(starts.c.meter_id == meter_id)).all()
+    # Of the three rows for the month, the one with the highest id stays
+    assert [row.id for row in kept] == [max(all_ids)]
+
+
+def test_migrate_script_rebuilds_rollups_after_dropping_duplicates():
+    meter_id = seed(meters=1, months=1, readings_per_month=3, household_token="migrate-script-household")[0]
+    today = datetime.date.today()
+    with database.engine.begin() as conn:
+        drop_start_index(conn)
+        # Sorts after any uuid4, so the migration keeps it over the
+        # start reading the rollup was built from
+        conn.execute(insert(models.StartReading.__table__).values(
+            id=uuid.UUID(int=2**128 - 1), meter_id=meter_id, year=today.year, month=today.month, reading_value=5.0
+        ))
+    result = subprocess.run(
+        [sys.executable, "migrate.py"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    )
+    assert "Deleted 1 duplicate rows" in result.stdout
+    assert database.missing_indexes() == []
+    assert crud.check_rollups(meter_id) == []
@@ -0,0 +1,64 @@
+# tests/test_query_budget.py
+import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+import crud
+import main
+import metrics
+from conftest import HOUSEHOLD, seed
+
+# SQL statements each call may issue, whatever the household's size
+METERS_BUDGET = 1
+SUMMARY_BUDGET = 1
+MONTHLY_BUDGET = 2
+EXPORT_BUDGET = 3
+
+
+@pytest.fixture(scope="module", params=[1, 12], ids=["1-meter", "12-meters"])
+def meters(request):
+    token = f"budget-{request.param}"
+    return token, seed(meters=request.param, months=12, readings_per_month=20, household_token=token)
+
+
+@pytest.mark.parametrize("size", [2, 50, 500])
+def test_meters_budget_does_not_grow_with_meters(size):
+    token = f"budget-meters-{size}"
+    seed(meters=size, months=2, readings_per_month=2, household_token=token)
+    with metrics.track_statements() as stats:
+        meters = crud.get_meters(token, cached=False)
+    assert len(meters) == size
+    assert stats.count == METERS_BUDGET
+
+
+def test_summary_budget(meters):
+    token, _ = meters
+    with metrics.track_statements() as stats:
+        crud.get_summary(token, cached=False)
+    assert stats.count <= SUMMARY_BUDGET
+
+
+def test_monthly_data_budget(meters):
+    _, meter_ids = meters
+    today = datetime.date.today()
+    with metrics.track_statements() as stats:
+        crud.get_monthly_data(str(meter_ids[-1]), today.year, today.month)
+    assert stats.count <= MONTHLY_BUDGET
+
+
+def test_excel_export_budget(meters):
+    _, meter_ids = meters
+    with metrics.track_statements() as stats:
+        crud.create_excel_export(str(meter_ids[-1]), datetime.date.today().year).close()
+    assert stats.count <= EXPORT_BUDGET
+
+
+def test_statements_reported_per_request(household):
+    client = TestClient(main.app)
+    response = client.get(f"/home/{HOUSEHOLD}/summary")
+    assert 'desc="' in response.headers["Server-Timing"]
+
+    body = client.get("/metrics").text
+    assert 'db_statements_total{method="GET",route="/home/{home_id}/summary"}' in body
+    assert 'http_request_duration_seconds_count{method="GET",route="/home/{home_id}/summary",status="200"}' in body
@@ -0,0 +1,113 @@
+# tests/test_readings_page.py
+import base64
+import datetime
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+
+import crud
+import database
+import main
+import models
+from conftest import seed
+
+HOUSEHOLD = "page-household"
+# Seven readings at each of three times, so pages split inside a tie
+TIMES = [datetime.datetime(2024, 1, day, 10) for day in (5, 12, 19)]
+PER_TIME = 7
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture(scope="module")
+def meter():
+    """(meter id, its readings in (reading_time, id) order)."""
+    meter_id = seed(
+        meters=1, months=1, readings_per_month=0, household_token=HOUSEHOLD, end=TIMES[0].date()
+    )[0]
+    rows = [
+        {
+            "id": uuid.uuid4(),
+            "meter_id": meter_id,
+            "reading_date": reading_time.date().replace(day=1),
+            "reading_time": reading_time,
+            "reading_value": 1000.0 + n,
+            "posted_by": "test",
+        }
+        for n, reading_time in enumerate(t for t in TIMES for _ in range(PER_TIME))
+    ]
+    with database.engine.begin() as conn:
+        conn.execute(insert(models.Reading.__table__), rows)
+    crud.rebuild_rollups(meter_id)
+    ordered = sorted(rows, key=lambda r: (r["reading_time"], r["id"]))
+    return meter_id, ordered
+
+
+def walk(client, meter_id, **params) -> tuple[list[dict], int]:
+    """Every page's readings in order, and how many pages there were."""
+    url = f"/home/{HOUSEHOLD}/meters/{meter_id}/readings"
+    readings, pages, after = [], 0, None
+    while True:
+        response = client.get(url, params={**params, **({"after": after} if after else {})})
+        assert response.status_code == 200
+        body = response.json()
+        readings += body["readings"]
+        pages += 1
+        after = body["next_cursor"]
+        if after is None:
+            return readings, pages
+
+
+@pytest.mark.parametrize("limit", [1, 4, PER_TIME, 50])
+def test_walk_equal_times_without_duplicates_or_skips(client, meter, limit):
+    meter_id, rows = meter
+    readings, pages = walk(client, meter_id, limit=limit)
+    assert [r["id"] for r in readings] == [str(r["id"]) for r in rows]
+    assert pages == -(-len(rows) // limit)
+
+
+@pytest.mark.parametrize("start, end, days", [
+    # 10:00 in Karachi is 05:00 UTC
+    ("2024-01-12T05:00:00+00:00", None, (12, 19)),
+    ("2024-01-12T05:00:01+00:00", None, (19,)),
+    (None, "2024-01-19T05:00:00+00:00", (5, 12)),
+    ("2024-01-05T10:00:00", "2024-01-12T10:00:00", (5,)),
+    ("2024-01-12T10:00:00+05:00", "2024-01-12T06:00:00+01:00", ()),
+])
+def test_offset_aware_bounds(client, meter, start, end, days):
+    meter_id, _ = meter
+    params = {"limit": 4, **({"from": start} if start else {}), **({"to": end} if end else {})}
+    readings, _ = walk(client, meter_id, **params)
+    assert [datetime.datetime.fromisoformat(r["time"]).day for r in readings] == [
+        day for day in days for _ in range(PER_TIME)
+    ]
+
+
+def test_projection(client, meter):
+    meter_id, rows = meter
+    readings, _ = walk(client, meter_id, limit=5, fields="time, reading")
+    assert all(set(r) == {"time", "reading"} for r in readings)
+    # The cursor still pages on (time, id) with id left out of the projection
+    assert [r["reading"] for r in readings] == [r["reading_value"] for r in rows]
+    response = client.get(f"/home/{HOUSEHOLD}/meters/{meter_id}/readings", params={"fields": "time,colour"})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor",
+    base64.urlsafe_b64encode(b"2024-01-05T10:00:00").decode(),
+    base64.urlsafe_b64encode(b"yesterday|" + str(uuid.uuid4()).encode()).decode(),
+    base64.urlsafe_b64encode(b"2024-01-05T10:00:00|not-a-uuid").decode(),
+    base64.urlsafe_b64encode(b"\xff\xfe|").decode(),
+])
+def test_malformed_cursor_is_rejected(client, meter, cursor):
+    meter_id, _ = meter
+    response = client.get(f"/home/{HOUSEHOLD}/meters/{meter_id}/readings", params={"after": cursor})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
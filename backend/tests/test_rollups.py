@@ -0,0 +1,83 @@
+# tests/test_rollups.py
+import datetime
+
+import pytest
+from fastapi import HTTPException
+from sqlmodel import select
+
+import crud
+import models
+import schemas
+from conftest import seed
+
+
+@pytest.fixture
+def meter_id():
+    """A meter with last month's and this month's start readings and 10 readings each."""
+    return seed(meters=1, months=2, readings_per_month=10, household_token="rollup-household")[0]
+
+
+def this_month() -> datetime.date:
+    return datetime.date.today().replace(day=1)
+
+
+def at(day: int, hour: int = 12) -> datetime.datetime:
+    return datetime.datetime.combine(this_month().replace(day=day), datetime.time(hour))
+
+
+def add(meter_id, value: float, reading_time: datetime.datetime):
+    crud.add_reading(str(meter_id), reading_time.date(), value, "test", reading_time)
+
+
+def latest(meter_id) -> schemas.EntryOut:
+    return crud.get_monthly_data(str(meter_id), this_month().year, this_month().month).entries[0]
+
+
+def test_add(meter_id):
+    add(meter_id, 2000.0, at(28, 23))
+    assert crud.check_rollups(meter_id) == []
+    assert latest(meter_id).reading == 2000.0
+
+
+def test_out_of_order_add(meter_id):
+    add(meter_id, 2000.0, at(28, 23))
+    # Earlier than the month's latest: counted, but not the latest
+    add(meter_id, 1001.0, at(1, 0))
+    assert crud.check_rollups(meter_id) == []
+    assert latest(meter_id).reading == 2000.0
+
+
+def test_equal_time_add(meter_id):
+    for value in range(2000, 2010):
+        add(meter_id, float(value), at(28, 23))
+    assert crud.check_rollups(meter_id) == []
+    # Ties are ordered by id on every read too
+    entries = crud.get_monthly_data(str(meter_id), this_month().year, this_month().month).entries
+    tied = [entry.id for entry in entries if entry.time == at(28, 23)]
+    assert tied == sorted(tied, reverse=True)
+
+
+def test_delete_latest(meter_id, sess):
+    for value in range(2000, 2005):
+        add(meter_id, float(value), at(28, 23))
+    for _ in range(5):
+        crud.delete_entry(str(latest(meter_id).id))
+        assert crud.check_rollups(meter_id) == []
+    # Down to the seeded readings
+    assert latest(meter_id).time < at(28, 23)
+    assert sess.exec(
+        select(models.Reading).where(models.Reading.meter_id == meter_id, models.Reading.reading_value >= 2000)
+    ).all() == []
+
+
+def test_set_start_reading(meter_id):
+    today = this_month()
+    crud.set_start_reading(str(meter_id), today.year, today.month, 900.0)
+    assert crud.check_rollups(meter_id) == []
+    # Next month takes readings only once it has a start reading
+    next_month = crud._next_month(today)
+    with pytest.raises(HTTPException):
+        add(meter_id, 1.0, datetime.datetime.combine(next_month, datetime.time(1)))
+    crud.set_start_reading(str(meter_id), next_month.year, next_month.month, 3000.0)
+    add(meter_id, 3001.0, datetime.datetime.combine(next_month, datetime.time(1)))
+    assert crud.check_rollups(meter_id) == []
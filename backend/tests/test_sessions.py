@@ -0,0 +1,78 @@
+# tests/test_sessions.py
+import datetime
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+import crud
+import database
+import main
+from conftest import HOUSEHOLD
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(main.app) as client:
+        yield client
+
+
+def checked_out() -> dict:
+    return {
+        "sync": database.pool_status(database.engine)["checked_out"],
+        "async": database.pool_status(database.async_engine.sync_engine)["checked_out"],
+    }
+
+
+def test_no_sessions_leak_under_load(client, household):
+    today = datetime.date.today()
+    meter_id = household[0]
+    requests = [
+        ("get", f"/home/{HOUSEHOLD}/meters", None),
+        ("get", f"/home/{HOUSEHOLD}/summary", None),
+        ("get", f"/home/{HOUSEHOLD}/meters/{meter_id}/data?year={today.year}&month={today.month}", None),
+        ("get", f"/home/{HOUSEHOLD}/meters/{meter_id}/readings?limit=50", None),
+        ("get", f"/home/{HOUSEHOLD}/meters/{meter_id}/hasStart?year={today.year}&month={today.month}", None),
+        ("get", f"/home/{HOUSEHOLD}/insights", None),
+        ("get", "/ping-db", None),
+        # Fails inside the handler: the session must still go back
+        ("post", f"/home/{HOUSEHOLD}/meters/{uuid.uuid4()}/entries",
+         {"date": today.isoformat(), "reading": 1.0, "name": "test"}),
+    ]
+
+    def call(n):
+        method, url, body = requests[n % len(requests)]
+        return client.request(method, url, json=body).status_code
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        statuses = list(executor.map(call, range(400)))
+
+    assert set(statuses) == {200, 404}
+    assert checked_out() == {"sync": 0, "async": 0}
+    # Never more connections than the pools allow
+    for engine in (database.engine, database.async_engine.sync_engine):
+        assert engine.pool.checkedin() <= database.POOL_SETTINGS["pool_size"]
+
+
+def test_sync_path(client, household, monkeypatch):
+    monkeypatch.setattr(crud, "DB_ASYNC", False)
+    checkouts = []
+
+    def checkout(*args):
+        checkouts.append(args)
+
+    event.listen(database.engine, "checkout", checkout)
+    today = datetime.date.today()
+    assert client.get(f"/home/{HOUSEHOLD}/summary").status_code == 200
+    response = client.get(
+        f"/home/{HOUSEHOLD}/meters/{household[1]}/data", params={"year": today.year, "month": today.month}
+    )
+    assert response.status_code == 200
+    # Queries on the worker thread are still counted against the request
+    assert 'desc="2 statements"' in response.headers["Server-Timing"]
+    event.remove(database.engine, "checkout", checkout)
+    # Through the sync engine
+    assert checkouts
+    assert checked_out() == {"sync": 0, "async": 0}
@@ -30,14 +30,17 @@ class MeterProvider extends ChangeNotifier {
     loading = true;
     notifyListeners();
     try {
-      final summary = await _api.fetchHomeSummary();
-      meters = summary.meters;
-      homeCurrentMonth = summary.homeCurrentMonth;
+      _applySummary(await _api.fetchHomeSummary());
     } finally {
       loading = false;
       notifyListeners();
     }
   }
+  void _applySummary(HomeSummary summary) {
+    meters = summary.meters;
+    homeCurrentMonth = summary.homeCurrentMonth;
+  }
+
   bool hasStart(String meterId, int year, int month) {
     if (_starts['$meterId-$year-$month'] == null) {
       return false;
@@ -51,42 +54,7 @@ class MeterProvider extends ChangeNotifier {
   Future<void> loadMonthly(String meterId, int year, int month) async {
     try {
       final data = await _api.fetchMonthlyData(meterId, year, month);
-
-      final key = _key(meterId, year, month);
-
-      // 1) Start reading
-      _starts[key] = (data['start_reading'] as num).toDouble();
-
-      // 2) Defensive casting of entries
-      final rawList = data['entries'];
-      if (rawList is! List) {
-        debugPrint("⚠️ loadMonthly: expected List in 'entries', got ${rawList.runtimeType}");
-        _entries[key] = [];
-      } else {
-        // If ApiService already returns List<Entry>, this will work, otherwise try-map
-        _entries[key] = rawList.every((e) => e is Entry)
-            ? List<Entry>.from(rawList as List<Entry>)
-            : rawList
-            .map((e) {
-          try {
-            return e as Entry;
-          } catch (_) {
-            // if it's a Map, try to parse
-            return Entry.fromJson(e as Map<String, dynamic>);
-          }
-        })
-            .toList();
-      }
-
-      // DEBUG: log how many entries loaded
-      debugPrint("✅ loadMonthly: loaded ${_entries[key]!.length} entries for $meterId $year-$month");
-
-      // 3) Compute danger level
-      final startVal = _starts[key]!;
-      final list    = _entries[key]!;
-      final usage   = list.isNotEmpty ? list.first.reading - startVal : 0.0;
-      _levels[key]   = _computeLevel(usage);
-
+      _applyMonthly(meterId, year, month, data);
       notifyListeners();
     } catch (err) {
       debugPrint("❌ loadMonthly error: $err");
@@ -95,6 +63,43 @@ class MeterProvider extends ChangeNotifier {
   }
 
 
+  void _applyMonthly(String meterId, int year, int month, Map<String, dynamic> data) {
+    final key = _key(meterId, year, month);
+
+    // 1) Start reading
+    _starts[key] = (data['start_reading'] as num).toDouble();
+
+    // 2) Defensive casting of entries
+    final rawList = data['entries'];
+    if (rawList is! List) {
+      debugPrint("⚠️ loadMonthly: expected List in 'entries', got ${rawList.runtimeType}");
+      _entries[key] = [];
+    } else {
+      // If ApiService already returns List<Entry>, this will work, otherwise try-map
+      _entries[key] = rawList.every((e) => e is Entry)
+          ? List<Entry>.from(rawList as List<Entry>)
+          : rawList
+          .map((e) {
+        try {
+          return e as Entry;
+        } catch (_) {
+          // if it's a Map, try to parse
+          return Entry.fromJson(e as Map<String, dynamic>);
+        }
+      })
+          .toList();
+    }
+
+    // DEBUG: log how many entries loaded
+    debugPrint("✅ loadMonthly: loaded ${_entries[key]!.length} entries for $meterId $year-$month");
+
+    // 3) Compute danger level
+    final startVal = _starts[key]!;
+    final list    = _entries[key]!;
+    final usage   = list.isNotEmpty ? list.first.reading - startVal : 0.0;
+    _levels[key]   = _computeLevel(usage);
+  }
+
   double? getStart(String meterId, int year, int month) =>
       _starts[_key(meterId, year, month)];
 
@@ -134,12 +139,13 @@ class MeterProvider extends ChangeNotifier {
     final isoDate  = '$yearStr-$monthStr-$dayStr';
 
     try {
-      final level = await _api.postEntry(meterId, isoDate, name, value,postingDate);
-
-      // reload from server rather than optimistic insert
-      await loadMonthly(meterId, year, month);
-      await loadSummary();
-      return level;
+      // the server returns the month and summary as written, so there is
+      // nothing to reload
+      final result = await _api.postEntry(meterId, isoDate, name, value,postingDate);
+      _applyMonthly(meterId, year, month, result['monthly'] as Map<String, dynamic>);
+      _applySummary(result['summary'] as HomeSummary);
+      notifyListeners();
+      return result['level'] as int;
     } catch (e) {
       throw Exception('Failed to add reading entry: $e');
     }
@@ -147,8 +153,9 @@ class MeterProvider extends ChangeNotifier {
 
   Future<void> removeEntry(
       String meterId, int year, int month, String entryId) async {
-    await _api.deleteEntry(meterId, entryId);
-    await loadMonthly(meterId, year, month);
+    final result = await _api.deleteEntry(meterId, entryId);
+    _applyMonthly(meterId, year, month, result['monthly'] as Map<String, dynamic>);
+    _applySummary(result['summary'] as HomeSummary);
     notifyListeners();
   }
 
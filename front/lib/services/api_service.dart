@@ -35,10 +35,45 @@ class ApiService {
         .replace(queryParameters: {
       'year': year.toString(),
       'month': month.toString(),
+      'format': 'columnar',
     });
     final res = await _client.get(uri);
     if (res.statusCode != 200) throw Exception('Load month failed');
-    final data = json.decode(res.body) as Map<String, dynamic>;
+    return _monthlyFromColumns(json.decode(res.body) as Map<String, dynamic>);
+  }
+
+  /// Parses `format=columnar`: parallel arrays of ids, epoch days, epoch
+  /// seconds and readings. Times are rebuilt as the same wall-clock values
+  /// the JSON format's offset-less timestamps parse to.
+  Map<String, dynamic> _monthlyFromColumns(Map<String, dynamic> data) {
+    final offset = data['utc_offset'] as int;
+    final columns = data['entries'] as Map<String, dynamic>;
+    final ids = columns['id'] as List;
+    final dates = columns['date'] as List;
+    final times = columns['time'] as List;
+    final readings = columns['reading'] as List;
+    return {
+      'start_reading': (data['start_reading'] as num).toDouble(),
+      'entries': [
+        for (var i = 0; i < ids.length; i++)
+          Entry(
+            id: ids[i] as String,
+            date: DateTime(1970, 1, 1 + (dates[i] as int)),
+            time: _wallClock(times[i] as int, offset),
+            reading: (readings[i] as num).toDouble(),
+          ),
+      ],
+    };
+  }
+
+  DateTime _wallClock(int epochSeconds, int offset) {
+    final t = DateTime.fromMillisecondsSinceEpoch(
+        (epochSeconds + offset) * 1000,
+        isUtc: true);
+    return DateTime(t.year, t.month, t.day, t.hour, t.minute, t.second);
+  }
+
+  Map<String, dynamic> _monthlyFromJson(Map<String, dynamic> data) {
     return {
       'start_reading': (data['start_reading'] as num).toDouble(),
       'entries': (data['entries'] as List)
@@ -47,6 +82,14 @@ class ApiService {
     };
   }
 
+  /// Parses the `monthly` and `summary` a write returns with include_state.
+  Map<String, dynamic> _stateFromJson(Map<String, dynamic> data) {
+    return {
+      'monthly': _monthlyFromJson(data['monthly'] as Map<String, dynamic>),
+      'summary': HomeSummary.fromJson(data['summary'] as Map<String, dynamic>),
+    };
+  }
+
   Future<void> postStartReading(
       String meterId, int year, int month, double reading) async {
     final res = await _client.post(
@@ -68,10 +111,13 @@ class ApiService {
   }
 
 
-  Future<int> postEntry(
+  /// Posts a reading and returns its `level` along with the refreshed
+  /// `monthly` data and home `summary`, saving the reloads afterwards.
+  Future<Map<String, dynamic>> postEntry(
       String meterId, String dateIso, String name, double reading, String postingDate) async {
     final uri = Uri.parse(
-        '$BASE_URL/home/$HOME_ID/meters/$meterId/entries');
+        '$BASE_URL/home/$HOME_ID/meters/$meterId/entries')
+        .replace(queryParameters: {'include_state': 'true'});
     final body = json.encode({
       'date': dateIso,
       'name': name,
@@ -94,7 +140,10 @@ class ApiService {
     }
 
     final data = json.decode(res.body) as Map<String, dynamic>;
-    return data['level'] as int? ?? 0;
+    return {
+      'level': data['level'] as int? ?? 0,
+      ..._stateFromJson(data),
+    };
   }
 
 
@@ -113,13 +162,16 @@ class ApiService {
     return body['has_start'] as bool;
   }
 
-  /// Deletes a reading entry by ID.
-  Future<void> deleteEntry(String meterId, String entryId) async {
-    final uri = Uri.parse('$BASE_URL/home/$HOME_ID/meters/$meterId/entries/$entryId');
+  /// Deletes a reading entry by ID and returns the refreshed `monthly`
+  /// data and home `summary`.
+  Future<Map<String, dynamic>> deleteEntry(String meterId, String entryId) async {
+    final uri = Uri.parse('$BASE_URL/home/$HOME_ID/meters/$meterId/entries/$entryId')
+        .replace(queryParameters: {'include_state': 'true'});
     final res = await _client.delete(uri);
-    if (res.statusCode != 200 && res.statusCode != 204) {
+    if (res.statusCode != 200) {
       throw Exception('Failed to delete entry (${res.statusCode}): ${res.body}');
     }
+    return _stateFromJson(json.decode(res.body) as Map<String, dynamic>);
   }
   /// Toggles the `is_frozen` state on the server.
   Future<bool> toggleFreeze(String meterId, bool freeze) async {